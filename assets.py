@@ -0,0 +1,61 @@
+"""Cached static files and precomputed response bodies for Mini App."""
+import os
+from typing import Dict, Optional, Tuple
+
+from webapp.serialization import dumps
+
+INDEX_PATH = "webapp/index.html"
+STATIC_DIR = "webapp/static"
+STATIC_CONTENT_TYPES = {
+    'css': 'text/css',
+    'js': 'application/javascript'
+}
+# Файлы, которые браузер Mini App запрашивает при каждом открытии
+PRELOAD_ASSETS = (
+    INDEX_PATH,
+    f"{STATIC_DIR}/css/style.css",
+    f"{STATIC_DIR}/js/app.js",
+)
+
+# путь -> (mtime файла, содержимое)
+_files: Dict[str, Tuple[float, bytes]] = {}
+_faq_body: Optional[bytes] = None
+
+
+def read_asset(file_path: str) -> bytes:
+    """Get file content, rereading it only when the file changes on disk.
+
+    Raises FileNotFoundError if file does not exist.
+    """
+    mtime = os.stat(file_path).st_mtime
+    cached = _files.get(file_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(file_path, "rb") as f:
+        content = f.read()
+    _files[file_path] = (mtime, content)
+    return content
+
+
+def preload_assets() -> int:
+    """Read frequently requested files into cache, return their count."""
+    loaded = 0
+    for file_path in PRELOAD_ASSETS:
+        try:
+            read_asset(file_path)
+            loaded += 1
+        except FileNotFoundError:
+            pass
+    return loaded
+
+
+def get_faq_body() -> bytes:
+    """Get encoded GET /api/faq response body."""
+    global _faq_body
+    if _faq_body is None:
+        from personality.faq import FAQ_QUESTIONS_ANSWERS
+        _faq_body = dumps({
+            "success": True,
+            "faq": FAQ_QUESTIONS_ANSWERS
+        })
+    return _faq_body
@@ -0,0 +1,236 @@
+"""Telegram WebApp initData authentication for Mini App API."""
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+from config.settings import TELEGRAM_BOT_TOKEN, logger
+from webapp.serialization import json_response
+
+INIT_DATA_HEADER = "X-Telegram-Init-Data"
+# Сколько действительна подпись initData (секунды)
+INIT_DATA_MAX_AGE = 24 * 3600
+AUTH_CACHE_MAX_SIZE = 10000
+# EventSource не умеет передавать заголовки, поэтому поток событий
+# открывается по короткоживущему токену в query вместо initData:
+# строка запроса попадает в access log
+EVENTS_PATH = "/api/events"
+STREAM_TOKEN_TTL = 300
+# WEBAPP_AUTH_REQUIRED=0 только для разработки: запросы без initData
+# пропускаются, а user_id из запроса принимается на веру (test_user_id)
+AUTH_REQUIRED = os.getenv("WEBAPP_AUTH_REQUIRED", "1") != "0"
+
+# Маршруты, не привязанные к пользователю
+PUBLIC_API_PATHS = frozenset({
+    "/api/products",
+    "/api/categories",
+    "/api/search",
+    "/api/faq",
+    "/api/ready",
+    # Защищены собственным токеном (X-Debug-Token)
+    "/api/debug/profile",
+    "/api/metrics",
+})
+PUBLIC_API_PREFIXES = ("/api/products/",)
+
+_secret_key: Optional[bytes] = None
+_verified: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "verified": 0, "rejected": 0}
+
+
+def _get_secret_key() -> bytes:
+    global _secret_key
+    if _secret_key is None:
+        _secret_key = hmac.new(
+            b"WebAppData", TELEGRAM_BOT_TOKEN.encode("utf-8"), hashlib.sha256
+        ).digest()
+    return _secret_key
+
+
+def verify_init_data(init_data: str) -> Tuple[int, float]:
+    """Validate Telegram initData signature.
+
+    Returns (user_id, auth_date).
+    Raises ValueError if data is malformed, forged or expired.
+    """
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop("hash", None)
+    if not received_hash:
+        raise ValueError("initData hash missing")
+
+    data_check_string = "\n".join(
+        f"{key}={value}" for key, value in sorted(fields.items())
+    )
+    expected_hash = hmac.new(
+        _get_secret_key(), data_check_string.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+    if not hmac.compare_digest(expected_hash, received_hash):
+        raise ValueError("initData signature mismatch")
+
+    try:
+        auth_date = float(fields["auth_date"])
+        user_id = int(json.loads(fields["user"])["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError("initData user or auth_date missing") from e
+    if time.time() - auth_date > INIT_DATA_MAX_AGE:
+        raise ValueError("initData expired")
+    return user_id, auth_date
+
+
+def authenticate(init_data: str) -> int:
+    """Get verified user id for initData, reusing earlier verifications.
+
+    Raises ValueError if initData is invalid.
+    """
+    now = time.time()
+    with _lock:
+        cached = _verified.get(init_data)
+        if cached is not None:
+            user_id, auth_date = cached
+            if now - auth_date <= INIT_DATA_MAX_AGE:
+                _verified.move_to_end(init_data)
+                _stats["hits"] += 1
+                return user_id
+            del _verified[init_data]
+
+    try:
+        user_id, auth_date = verify_init_data(init_data)
+    except ValueError:
+        with _lock:
+            _stats["rejected"] += 1
+        raise
+
+    with _lock:
+        _verified[init_data] = (user_id, auth_date)
+        while len(_verified) > AUTH_CACHE_MAX_SIZE:
+            _verified.popitem(last=False)
+        _stats["verified"] += 1
+    return user_id
+
+
+def _stream_signature(payload: str) -> str:
+    return hmac.new(
+        _get_secret_key(), b"stream:" + payload.encode("utf-8"),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def issue_stream_token(user_id: int) -> str:
+    """Sign token that opens event stream of user for STREAM_TOKEN_TTL."""
+    payload = f"{user_id}.{int(time.time()) + STREAM_TOKEN_TTL}"
+    return f"{payload}.{_stream_signature(payload)}"
+
+
+def verify_stream_token(token: str) -> int:
+    """Get user id of token issued by issue_stream_token.
+
+    Raises ValueError if token is malformed, forged or expired.
+    """
+    payload, _, signature = token.rpartition(".")
+    if not hmac.compare_digest(
+        _stream_signature(payload).encode("ascii"), signature.encode("utf-8")
+    ):
+        raise ValueError("stream token signature mismatch")
+    user_id, _, expires = payload.partition(".")
+    if int(expires) < time.time():
+        raise ValueError("stream token expired")
+    return int(user_id)
+
+
+def resolve_user_id(request: web.Request, claimed: Any) -> Optional[int]:
+    """Get user id for handler.
+
+    Verified one if present; the claimed id is trusted only when
+    authentication is disabled.
+    """
+    verified = request.get("user_id")
+    if verified is not None:
+        return verified
+    if AUTH_REQUIRED or claimed in (None, ""):
+        return None
+    return int(claimed)
+
+
+def verify_request(request: web.Request) -> Optional[int]:
+    """Verify request's initData (or stream token) once, remember outcome.
+
+    Returns verified user id, or None if initData is absent or invalid;
+    for invalid one request['init_data_error'] holds the reason. Later
+    calls for the same request (rate limiter, then auth middleware)
+    reuse the outcome, so counters see each request once.
+    """
+    if "user_id" in request:
+        return request["user_id"]
+    if "init_data_error" in request:
+        return None
+    init_data = request.headers.get(INIT_DATA_HEADER)
+    token = (
+        request.query.get("token") if request.path == EVENTS_PATH else None
+    )
+    if not init_data and not token:
+        return None
+    try:
+        if init_data:
+            request["user_id"] = authenticate(init_data)
+        else:
+            request["user_id"] = verify_stream_token(token)
+    except ValueError as e:
+        request["init_data_error"] = str(e)
+        return None
+    return request["user_id"]
+
+
+@web.middleware
+async def auth_middleware(request: web.Request, handler):
+    """Verify Telegram initData and expose user id as request['user_id']."""
+    if not request.path.startswith("/api/"):
+        return await handler(request)
+
+    user_id = verify_request(request)
+    error = request.get("init_data_error")
+    if error is not None:
+        logger.warning("Отклонен initData от %s: %s", request.remote, error)
+        return json_response(
+            {"success": False, "error": "Invalid Telegram initData"},
+            status=401
+        )
+    if user_id is None and (
+        AUTH_REQUIRED and
+        request.path not in PUBLIC_API_PATHS and
+        not request.path.startswith(PUBLIC_API_PREFIXES)
+    ):
+        return json_response(
+            {"success": False, "error": "Telegram initData required"},
+            status=401
+        )
+
+    return await handler(request)
+
+
+async def check_auth_settings(app: web.Application) -> None:
+    """on_startup hook: fail without bot token, warn if auth is off."""
+    if not TELEGRAM_BOT_TOKEN:
+        raise RuntimeError(
+            "TELEGRAM_BOT_TOKEN не задан: проверить initData невозможно"
+        )
+    _get_secret_key()
+    if not AUTH_REQUIRED:
+        logger.warning(
+            "⚠️ Проверка initData отключена (WEBAPP_AUTH_REQUIRED=0): "
+            "user_id из запросов принимается без проверки"
+        )
+
+
+def auth_stats() -> Dict[str, Any]:
+    """Get initData verification counters."""
+    with _lock:
+        stats = dict(_stats)
+        stats["cache_size"] = len(_verified)
+    return stats
@@ -0,0 +1 @@
+"""Micro-benchmarks for Mini App server hot paths."""
@@ -0,0 +1,120 @@
+"""Compare per-request float price parsing with webapp.pricing quotes.
+
+Run from the project root:
+    python -m webapp.benchmarks.bench_pricing [products_count]
+"""
+import random
+import sys
+from typing import Any, Dict, List, Tuple
+
+from utils.delivery import calculate_delivery_cost
+from webapp.benchmarks.bench_serialization import bench, make_catalog
+from webapp.catalog import CatalogSnapshot
+from webapp.pricing import cart_subtotal, quote_cart
+
+CARTS = 1000
+CART_LINES = 12
+
+
+def make_carts(
+    catalog: List[Dict[str, Any]], count: int
+) -> List[List[Tuple[str, int]]]:
+    """Random carts over catalog ids, like rows of the cart table."""
+    rng = random.Random(7)
+    return [
+        [
+            (rng.choice(catalog)["id"], rng.randint(1, 5))
+            for _ in range(rng.randint(1, CART_LINES))
+        ]
+        for _ in range(count)
+    ]
+
+
+def legacy_quote(
+    cart: List[Tuple[str, int]], by_id: Dict[str, Dict[str, Any]],
+    with_delivery: bool
+) -> float:
+    """Pricing as handlers did it before: float() of each product price."""
+    subtotal = 0
+    for product_id, quantity in cart:
+        product = by_id.get(product_id)
+        if not product:
+            continue
+        try:
+            subtotal += float(product.get("price", 0)) * quantity
+        except (ValueError, TypeError):
+            pass
+    if with_delivery:
+        return subtotal + calculate_delivery_cost(subtotal)
+    return subtotal
+
+
+def legacy_enrich(
+    cart: List[Tuple[str, int]], by_id: Dict[str, Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Cart lines with float subtotals, as GET /api/cart built them."""
+    lines = []
+    total = 0
+    for product_id, quantity in cart:
+        product = by_id.get(product_id)
+        if not product:
+            continue
+        try:
+            subtotal = float(product.get("price", 0)) * quantity
+        except (ValueError, TypeError):
+            subtotal = 0
+        total += subtotal
+        lines.append({
+            "product_id": product_id, "quantity": quantity,
+            "subtotal": subtotal
+        })
+    return {
+        "lines": lines,
+        "total": total + calculate_delivery_cost(total)
+    }
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    products = make_catalog(count)
+    snapshot = CatalogSnapshot(products, 0, 1)
+    carts = make_carts(products, CARTS)
+    by_id = snapshot.by_id
+
+    cases = [
+        (
+            "subtotal",
+            lambda: [legacy_quote(c, by_id, False) for c in carts],
+            lambda: [cart_subtotal(c, snapshot) for c in carts]
+        ),
+        (
+            "order (+ delivery)",
+            lambda: [legacy_quote(c, by_id, True) for c in carts],
+            lambda: [quote_cart(c, snapshot, with_lines=False) for c in carts]
+        ),
+        (
+            "quote with lines",
+            lambda: [legacy_enrich(c, by_id) for c in carts],
+            lambda: [quote_cart(c, snapshot) for c in carts]
+        ),
+    ]
+
+    print(
+        f"Каталог: {count} товаров; {CARTS} корзин "
+        f"до {CART_LINES} позиций"
+    )
+    print(
+        f"{'quote':<22}{'float, q/s':>14}{'pricing, q/s':>16}{'x':>8}"
+    )
+    for name, baseline, candidate in cases:
+        base_ms = bench(baseline)
+        cand_ms = bench(candidate)
+        print(
+            f"{name:<22}{CARTS / base_ms * 1000:>14.0f}"
+            f"{CARTS / cand_ms * 1000:>16.0f}"
+            f"{base_ms / cand_ms if cand_ms else 0:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
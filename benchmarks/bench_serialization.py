@@ -0,0 +1,121 @@
+"""Compare stdlib json with webapp.serialization on synthetic payloads.
+
+Run from the project root:
+    python -m webapp.benchmarks.bench_serialization [products_count]
+"""
+import json
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+from webapp.serialization import BACKEND, dumps, loads
+
+REPEATS = 20
+
+
+def make_catalog(count: int) -> List[Dict[str, Any]]:
+    """Build catalog resembling products_cache content."""
+    rng = random.Random(42)
+    words = [
+        "микрофибра", "салфетка", "универсальная", "для", "стекол",
+        "кухни", "автомобиля", "полотенце", "плотная", "набор"
+    ]
+    catalog = []
+    for i in range(count):
+        catalog.append({
+            "id": str(100000 + i),
+            "name": " ".join(rng.choice(words) for _ in range(4)),
+            "price": f"{rng.randint(50, 5000)}.00",
+            "category_id": str(rng.randint(1, 40)),
+            "description": " ".join(rng.choice(words) for _ in range(60)),
+            "pictures": [
+                f"https://example.com/img/{i}_{n}.jpg" for n in range(3)
+            ],
+            "available": rng.random() > 0.1
+        })
+    return catalog
+
+
+def make_order_data() -> Dict[str, Any]:
+    return {
+        "name": "Иван Петров",
+        "shipping": "СДЭК",
+        "address": "г. Санкт-Петербург, Невский проспект, д. 1, кв. 1",
+        "phone": "+7 900 000-00-00",
+        "telegram": "@ivan",
+        "comment": "Позвонить за час до доставки"
+    }
+
+
+def bench(func: Callable[[], Any]) -> float:
+    """Best-of-REPEATS wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    catalog = make_catalog(count)
+    catalog_text = json.dumps(catalog, ensure_ascii=False)
+    cart = {
+        "success": True,
+        "cart": [
+            {"product_id": p["id"], "quantity": 2, "product": p,
+             "subtotal": 200.0}
+            for p in catalog[:10]
+        ],
+        "total": 2000.0
+    }
+    order_blobs = [
+        json.dumps(make_order_data(), ensure_ascii=False) for _ in range(50)
+    ]
+    products_response = {
+        "success": True, "products": catalog, "count": len(catalog)
+    }
+
+    cases = [
+        (
+            "parse products_cache",
+            lambda: json.loads(catalog_text),
+            lambda: loads(catalog_text)
+        ),
+        (
+            "GET /api/products body",
+            lambda: json.dumps(products_response).encode("utf-8"),
+            lambda: dumps(products_response)
+        ),
+        (
+            "GET /api/cart body",
+            lambda: json.dumps(cart).encode("utf-8"),
+            lambda: dumps(cart)
+        ),
+        (
+            "parse 50 order_data",
+            lambda: [json.loads(blob) for blob in order_blobs],
+            lambda: [loads(blob) for blob in order_blobs]
+        ),
+    ]
+
+    print(
+        f"Каталог: {count} товаров, {len(catalog_text) / 1e6:.1f} МБ JSON; "
+        f"backend: {BACKEND}"
+    )
+    if BACKEND == "json":
+        print("orjson не установлен: сравнивается stdlib со stdlib")
+    print(f"{'route':<26}{'stdlib, ms':>12}{BACKEND + ', ms':>14}{'x':>8}")
+    for name, baseline, candidate in cases:
+        base_ms = bench(baseline)
+        cand_ms = bench(candidate)
+        print(
+            f"{name:<26}{base_ms:>12.2f}{cand_ms:>14.2f}"
+            f"{base_ms / cand_ms if cand_ms else 0:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Per-user enriched cart cache for Mini App."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.connection import get_db_connection
+from webapp.catalog import CatalogSnapshot, get_catalog
+from webapp.pricing import quote_cart, to_rubles
+from webapp.profiling import stage
+
+CART_CACHE_MAX_USERS = 5000
+# Корзину меняет и бот, поэтому запись не живет дольше этого времени
+CART_CACHE_TTL = 60.0
+
+
+class _CartEntry:
+    """Cached cart quantities and enriched payload for one user."""
+
+    __slots__ = ("items", "loaded_at", "catalog_version", "payload")
+
+    def __init__(self, items: "OrderedDict[str, int]"):
+        self.items = items
+        self.loaded_at = time.monotonic()
+        self.catalog_version: Optional[int] = None
+        self.payload: Optional[Dict[str, Any]] = None
+
+
+_entries: "OrderedDict[int, _CartEntry]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "rebuilds": 0, "misses": 0, "evictions": 0}
+
+
+def _load_items(user_id: int) -> "OrderedDict[str, int]":
+    """Read user's cart rows from DB."""
+    with stage("db"), get_db_connection() as conn:
+        rows = conn.execute(
+            "SELECT product_id, quantity FROM cart WHERE user_id = ?",
+            (user_id,)
+        ).fetchall()
+    return OrderedDict((str(row[0]), row[1]) for row in rows)
+
+
+def enrich_cart(
+    items: List[Tuple[str, int]],
+    catalog: Optional[CatalogSnapshot]
+) -> Dict[str, Any]:
+    """Attach product data and subtotals to cart lines and quote cart.
+
+    Lines of products without a valid price have subtotal None.
+    """
+    quote = quote_cart(items, catalog)
+    cart_with_products = [
+        {
+            "product_id": product_id,
+            "quantity": quantity,
+            "product": product,
+            "subtotal": to_rubles(line_total)
+            if line_total is not None else None
+        }
+        for product_id, quantity, product, line_total in quote["lines"]
+    ]
+    return {
+        "cart": cart_with_products,
+        "subtotal": quote["subtotal"],
+        "delivery_cost": quote["delivery_cost"],
+        "total": quote["total"],
+        "unpriced": quote["unpriced"]
+    }
+
+
+def get_enriched_cart(user_id: int) -> Dict[str, Any]:
+    """Get user's cart with product data, served from cache when possible.
+
+    The enriched payload is rebuilt without touching the DB when the
+    catalog version changes.
+    """
+    catalog = get_catalog()
+    version = catalog.version if catalog is not None else None
+    with _lock:
+        entry = _entries.get(user_id)
+        if (
+            entry is not None and
+            time.monotonic() - entry.loaded_at > CART_CACHE_TTL
+        ):
+            del _entries[user_id]
+            entry = None
+        if entry is not None:
+            _entries.move_to_end(user_id)
+            if entry.payload is not None and entry.catalog_version == version:
+                _stats["hits"] += 1
+                return entry.payload
+            _stats["rebuilds"] += 1
+        else:
+            _stats["misses"] += 1
+
+    if entry is None:
+        entry = _CartEntry(_load_items(user_id))
+
+    with _lock:
+        entry.payload = enrich_cart(list(entry.items.items()), catalog)
+        entry.catalog_version = version
+        _entries[user_id] = entry
+        _entries.move_to_end(user_id)
+        while len(_entries) > CART_CACHE_MAX_USERS:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+        return entry.payload
+
+
+def get_cart_items(user_id: int) -> List[Tuple[str, int]]:
+    """Get (product_id, quantity) lines of user's cart."""
+    with _lock:
+        entry = _entries.get(user_id)
+        if (
+            entry is not None and
+            time.monotonic() - entry.loaded_at <= CART_CACHE_TTL
+        ):
+            return list(entry.items.items())
+    return list(_load_items(user_id).items())
+
+
+def _load_line(user_id: int, product_id: str) -> Optional[int]:
+    """Read quantity of one cart line from DB, None if it is absent."""
+    with stage("db"), get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT quantity FROM cart WHERE user_id = ? AND product_id = ?",
+            (user_id, product_id)
+        ).fetchone()
+    return row[0] if row else None
+
+
+def cart_line_changed(user_id: int, product_id: str) -> None:
+    """Write-through after a cart line was added, updated or removed.
+
+    The line is re-read from DB instead of repeating database.cart
+    rules in memory, so the cache cannot drift from the table.
+    """
+    with _lock:
+        if user_id not in _entries:
+            return
+    quantity = _load_line(user_id, product_id)
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is None:
+            return
+        if quantity is not None:
+            entry.items[product_id] = quantity
+        else:
+            entry.items.pop(product_id, None)
+        entry.payload = None
+
+
+def cart_cleared(user_id: int) -> None:
+    """Write-through for emptied cart."""
+    with _lock:
+        entry = _entries.get(user_id)
+        if entry is not None:
+            entry.items.clear()
+            entry.payload = None
+
+
+def invalidate_cart(user_id: int) -> None:
+    """Drop cached cart, e.g. after the bot changed it directly."""
+    with _lock:
+        _entries.pop(user_id, None)
+
+
+def cart_cache_stats() -> Dict[str, Any]:
+    """Get cart cache counters and hit rate."""
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_entries)
+    requests = stats["hits"] + stats["rebuilds"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / requests, 4) if requests else 0.0
+    return stats
@@ -0,0 +1,178 @@
+"""In-memory catalog snapshot for Mini App handlers."""
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import logger
+from database.connection import get_db_connection
+from webapp.pricing import to_kopecks
+from webapp.profiling import stage
+from webapp.serialization import loads
+
+# Как часто перечитываем products_cache из БД (секунды)
+CATALOG_REFRESH_INTERVAL = 30.0
+
+
+class CatalogSnapshot:
+    """Parsed products list with id, price and search indexes."""
+
+    def __init__(
+        self, products: List[Dict[str, Any]], content_hash: int, version: int
+    ):
+        self.products = products
+        self.content_hash = content_hash
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        # Цены в копейках, разобраны один раз при загрузке
+        self.prices: Dict[str, Optional[int]] = {}
+        self._search_index: Optional[List[Tuple[str, Dict[str, Any]]]] = None
+        unpriced = []
+        for product in products:
+            if not isinstance(product, dict) or "id" not in product:
+                continue
+            product_id = str(product["id"])
+            self.by_id[product_id] = product
+            price = to_kopecks(product.get("price", 0))
+            if price is None:
+                unpriced.append(product_id)
+            self.prices[product_id] = price
+        if unpriced:
+            # Такие товары нельзя заказать, пока цену не исправят
+            logger.warning(
+                "Товары без корректной цены (версия каталога %d): %d, "
+                "например %s",
+                version, len(unpriced), ", ".join(unpriced[:10])
+            )
+
+    def get(self, product_id: Any) -> Optional[Dict[str, Any]]:
+        """Get product by id."""
+        return self.by_id.get(str(product_id))
+
+    @property
+    def search_index(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Lowercased name and description of each product, built once."""
+        if self._search_index is None:
+            self._search_index = [
+                (
+                    (product.get("name") or "").lower() + "\x00" +
+                    (product.get("description") or "").lower(),
+                    product
+                )
+                for product in self.products
+                if isinstance(product, dict)
+            ]
+        return self._search_index
+
+    def search(self, query: str) -> List[Dict[str, Any]]:
+        """Find products whose name or description contains query."""
+        query_lower = query.lower()
+        return [
+            product for haystack, product in self.search_index
+            if query_lower in haystack
+        ]
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_lock = threading.Lock()
+
+
+def _read_products_content() -> Optional[str]:
+    """Read raw products JSON from products_cache."""
+    with stage("db"), get_db_connection() as conn:
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        c.execute("SELECT content FROM products_cache WHERE key = 'products'")
+        row = c.fetchone()
+        if row and row['content']:
+            return row['content']
+    return None
+
+
+def get_catalog(force: bool = False) -> Optional[CatalogSnapshot]:
+    """Get current catalog snapshot, reloading it when products change.
+
+    JSON is parsed only when the stored content differs from the
+    snapshot, so handlers can call this on every request.
+    Returns None if the catalog is not loaded yet.
+    Raises JSONDecodeError if stored products are corrupted.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    now = time.monotonic()
+    if (
+        not force and snapshot is not None and
+        now - snapshot.checked_at < CATALOG_REFRESH_INTERVAL
+    ):
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshot
+        if (
+            not force and snapshot is not None and
+            now - snapshot.checked_at < CATALOG_REFRESH_INTERVAL
+        ):
+            return snapshot
+
+        content = _read_products_content()
+        if content is None:
+            _snapshot = None
+            return None
+
+        content_hash = hash(content)
+        if snapshot is not None and snapshot.content_hash == content_hash:
+            snapshot.checked_at = time.monotonic()
+            return snapshot
+
+        products = loads(content)
+        version = snapshot.version + 1 if snapshot is not None else 1
+        _snapshot = CatalogSnapshot(products, content_hash, version)
+        logger.info(
+            "Каталог Mini App обновлен: %d товаров, версия %d",
+            len(products), version
+        )
+        return _snapshot
+
+
+def invalidate_catalog() -> None:
+    """Force catalog reload on next access."""
+    snapshot = _snapshot
+    if snapshot is not None:
+        snapshot.checked_at = float("-inf")
+
+
+def diff_catalogs(
+    old: CatalogSnapshot, new: CatalogSnapshot
+) -> Dict[str, Any]:
+    """Compact delta between two snapshots.
+
+    "changed" holds new and modified products with only the fields that
+    differ (plus id), "removed" holds ids of products that disappeared.
+    """
+    changed = []
+    for product_id, product in new.by_id.items():
+        previous = old.by_id.get(product_id)
+        if previous is None:
+            changed.append(product)
+            continue
+        if previous == product:
+            continue
+        fields = {
+            key: value for key, value in product.items()
+            if previous.get(key) != value
+        }
+        for key in previous.keys() - product.keys():
+            fields[key] = None
+        fields["id"] = product["id"]
+        changed.append(fields)
+    removed = [
+        old.by_id[product_id]["id"] for product_id in old.by_id
+        if product_id not in new.by_id
+    ]
+    return {
+        "from_version": old.version,
+        "version": new.version,
+        "changed": changed,
+        "removed": removed
+    }
@@ -0,0 +1,150 @@
+"""Local FAQ intent matcher answering chat messages without the LLM."""
+import html
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from config.settings import logger
+
+# Минимальное косинусное сходство для ответа из FAQ
+FAQ_MATCH_THRESHOLD = 0.55
+# Длинные сообщения почти всегда требуют модели
+FAQ_MAX_MESSAGE_LENGTH = 200
+# Русские слова сравниваем по началу, чтобы "доставка" и "доставку" совпали
+STEM_LENGTH = 5
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOP_WORDS = frozenset({
+    "а", "в", "во", "и", "к", "ко", "на", "не", "ни", "о", "об", "от",
+    "по", "с", "со", "у", "за", "из", "до", "для", "при", "про", "же",
+    "ли", "бы", "то", "это", "как", "что", "где", "когда", "какой",
+    "какие", "какая", "можно", "мне", "я", "вы", "вас", "вам",
+    "ваш", "ваши", "есть", "или", "но", "да", "нет", "так",
+    "подскажите", "скажите", "пожалуйста", "здравствуйте", "привет",
+})
+
+
+def tokenize(text: str) -> Set[str]:
+    """Split text into stemmed lowercase tokens without stop words."""
+    tokens = set()
+    for word in _TOKEN_RE.findall(text.lower()):
+        if word in _STOP_WORDS or len(word) < 2 or word.isdigit():
+            continue
+        tokens.add(word[:STEM_LENGTH])
+    return tokens
+
+
+class FaqMatcher:
+    """Inverted token index over FAQ questions with IDF-weighted scoring."""
+
+    def __init__(self, faq: List[Dict[str, Any]]):
+        self.entries: List[Dict[str, Any]] = []
+        self.index: Dict[str, List[int]] = defaultdict(list)
+        entry_tokens: List[Set[str]] = []
+        for item in faq:
+            question = item.get("question") or ""
+            answer = item.get("answer") or ""
+            tokens = tokenize(question)
+            if not tokens or not answer:
+                continue
+            entry_id = len(self.entries)
+            self.entries.append({"question": question, "answer": answer})
+            entry_tokens.append(tokens)
+            for token in tokens:
+                self.index[token].append(entry_id)
+
+        count = len(self.entries)
+        self.idf = {
+            token: math.log(1 + count / len(ids))
+            for token, ids in self.index.items()
+        }
+        self.norms = [
+            math.sqrt(sum(self.idf[t] ** 2 for t in tokens))
+            for tokens in entry_tokens
+        ]
+
+    def match(self, message: str) -> Optional[Dict[str, Any]]:
+        """Get best FAQ entry with score, or None below threshold."""
+        tokens = tokenize(message)
+        known = [t for t in tokens if t in self.index]
+        if not known:
+            return None
+
+        # Незнакомые слова тоже снижают сходство: вопрос может быть о другом
+        unknown_weight = max(self.idf.values()) if self.idf else 0
+        query_norm = math.sqrt(
+            sum(self.idf[t] ** 2 for t in known) +
+            (len(tokens) - len(known)) * unknown_weight ** 2
+        )
+        scores: Dict[int, float] = defaultdict(float)
+        for token in known:
+            weight = self.idf[token] ** 2
+            for entry_id in self.index[token]:
+                scores[entry_id] += weight
+
+        best_id, best_dot = max(scores.items(), key=lambda item: item[1])
+        score = best_dot / (query_norm * self.norms[best_id])
+        if score < FAQ_MATCH_THRESHOLD:
+            return None
+        entry = self.entries[best_id]
+        return {
+            "question": entry["question"],
+            "answer": entry["answer"],
+            "score": round(score, 3)
+        }
+
+
+_matcher: Optional[FaqMatcher] = None
+_lock = threading.Lock()
+_stats = {"messages": 0, "answered": 0}
+
+
+def get_faq_matcher() -> FaqMatcher:
+    """Get matcher built over personality.faq entries."""
+    global _matcher
+    if _matcher is None:
+        with _lock:
+            if _matcher is None:
+                from personality.faq import FAQ_QUESTIONS_ANSWERS
+                _matcher = FaqMatcher(FAQ_QUESTIONS_ANSWERS)
+                logger.info(
+                    "FAQ-матчер построен: %d вопросов, %d токенов",
+                    len(_matcher.entries), len(_matcher.index)
+                )
+    return _matcher
+
+
+def answer_from_faq(message: str) -> Optional[Dict[str, Any]]:
+    """Answer chat message from FAQ if it confidently matches a question.
+
+    Returns match with HTML-escaped "reply", or None when the message
+    should go to the model.
+    """
+    with _lock:
+        _stats["messages"] += 1
+    if len(message) > FAQ_MAX_MESSAGE_LENGTH:
+        return None
+    try:
+        match = get_faq_matcher().match(message)
+    except Exception as e:
+        logger.error("Ошибка FAQ-матчера: %s", e)
+        return None
+    if match is None:
+        return None
+    with _lock:
+        _stats["answered"] += 1
+    match["reply"] = html.escape(match["answer"])
+    return match
+
+
+def faq_matcher_stats() -> Dict[str, Any]:
+    """Get share of chat messages answered from FAQ."""
+    with _lock:
+        stats = dict(_stats)
+    stats["short_circuit_rate"] = (
+        round(stats["answered"] / stats["messages"], 4)
+        if stats["messages"] else 0.0
+    )
+    return stats
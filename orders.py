@@ -0,0 +1,339 @@
+"""Order pipeline for Mini App: pricing, persistence, idempotency, history."""
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import logger
+from database.connection import get_db_connection
+from webapp.cart_cache import cart_cleared
+from webapp.catalog import get_catalog
+from webapp.pricing import quote_cart
+from webapp.profiling import stage
+from webapp.serialization import dumps_str, loads
+
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+
+ORDERS_PAGE_SIZE = 20
+ORDERS_PAGE_SIZE_MAX = 50
+# Кэш страниц истории заказов
+ORDERS_CACHE_MAX_USERS = 1000
+# Курсор задает клиент, поэтому число страниц на пользователя ограничено
+ORDERS_CACHE_MAX_PAGES = 8
+ORDERS_CACHE_TTL = 60.0
+
+_schema_ready = False
+
+
+def _ensure_schema(conn) -> None:
+    """Create idempotency keys table if needed (cheap, on request path)."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS webapp_order_keys (
+            user_id INTEGER NOT NULL,
+            idempotency_key TEXT NOT NULL,
+            order_id INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (user_id, idempotency_key)
+        )
+        """
+    )
+    conn.commit()
+    _schema_ready = True
+
+
+def ensure_order_indexes() -> int:
+    """Create order history index; run from warm-up, not on requests.
+
+    On a large orders table the index build takes a while, so it must
+    not run on the event loop. Returns number of indexed orders.
+    """
+    with get_db_connection() as conn:
+        _ensure_schema(conn)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_orders_user_created "
+            "ON orders (user_id, created_at, id)"
+        )
+        conn.commit()
+        return conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def place_order(
+    user_id: int,
+    order_data: Dict[str, Any],
+    idempotency_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """Price user's cart, save order and clear cart in one transaction.
+
+    If idempotency_key was already used by this user, the existing
+    order is returned and nothing is written.
+    Raises ValueError if the cart is empty, the catalog is not loaded,
+    a product is missing from it or has no valid price, or the
+    subtotal is zero.
+    """
+    timings = {}
+    started = time.perf_counter()
+    catalog = get_catalog()
+    timings["catalog_ms"] = _elapsed_ms(started)
+
+    # stage("db") только вокруг запросов: расчет и сериализация внутри
+    # транзакции учитываются в своих этапах
+    payload = dumps_str(order_data)
+    with get_db_connection() as conn:
+        with stage("db"):
+            _ensure_schema(conn)
+            if conn.in_transaction:
+                conn.commit()
+            stage_started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            if idempotency_key:
+                with stage("db"):
+                    row = conn.execute(
+                        "SELECT k.order_id, o.total_amount "
+                        "FROM webapp_order_keys k "
+                        "LEFT JOIN orders o ON o.id = k.order_id "
+                        "WHERE k.user_id = ? AND k.idempotency_key = ?",
+                        (user_id, idempotency_key)
+                    ).fetchone()
+                if row:
+                    conn.rollback()
+                    logger.info(
+                        "Повторная отправка заказа %s (user_id=%s)",
+                        row[0], user_id
+                    )
+                    return {
+                        "order_id": row[0],
+                        "total": row[1],
+                        "duplicate": True,
+                        "timings": timings
+                    }
+
+            with stage("db"):
+                cart_items = conn.execute(
+                    "SELECT product_id, quantity FROM cart WHERE user_id = ?",
+                    (user_id,)
+                ).fetchall()
+            timings["cart_ms"] = _elapsed_ms(stage_started)
+            if not cart_items:
+                conn.rollback()
+                raise ValueError("Cart is empty")
+
+            stage_started = time.perf_counter()
+            quote = quote_cart(cart_items, catalog, with_lines=False)
+            # Заказ без цены товаров стал бы заказом одной доставки
+            error = None
+            if catalog is None:
+                error = "Catalog is not loaded"
+            elif quote["missing"]:
+                error = (
+                    "Products no longer available: " +
+                    ", ".join(quote["missing"])
+                )
+            elif quote["unpriced"]:
+                error = (
+                    "Products without valid price: " +
+                    ", ".join(quote["unpriced"])
+                )
+            elif quote["subtotal_kopecks"] <= 0:
+                error = "Order subtotal is zero"
+            if error is not None:
+                conn.rollback()
+                raise ValueError(error)
+            subtotal = quote["subtotal"]
+            delivery_cost = quote["delivery_cost"]
+            total = quote["total"]
+            timings["pricing_ms"] = _elapsed_ms(stage_started)
+
+            stage_started = time.perf_counter()
+            # Время как у заказов бота (DEFAULT CURRENT_TIMESTAMP, UTC),
+            # иначе порядок (created_at, id) в истории заказов нарушится
+            with stage("db"):
+                cursor = conn.execute(
+                    "INSERT INTO orders "
+                    "(user_id, order_data, total_amount, status, created_at) "
+                    "VALUES (?, ?, ?, 'pending', CURRENT_TIMESTAMP)",
+                    (user_id, payload, total)
+                )
+                order_id = cursor.lastrowid
+                if idempotency_key:
+                    conn.execute(
+                        "INSERT INTO webapp_order_keys "
+                        "(user_id, idempotency_key, order_id, created_at) "
+                        "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+                        (user_id, idempotency_key, order_id)
+                    )
+                conn.execute(
+                    "DELETE FROM cart WHERE user_id = ?", (user_id,)
+                )
+                conn.commit()
+            timings["write_ms"] = _elapsed_ms(stage_started)
+        except Exception:
+            conn.rollback()
+            raise
+
+    cart_cleared(user_id)
+    invalidate_user_orders(user_id)
+    timings["total_ms"] = _elapsed_ms(started)
+    logger.info(
+        "Заказ %s оформлен (user_id=%s, позиций=%d, сумма=%.2f), "
+        "этапы: %s",
+        order_id, user_id, len(cart_items), total, timings
+    )
+    return {
+        "order_id": order_id,
+        "total": total,
+        "subtotal": subtotal,
+        "delivery_cost": delivery_cost,
+        "duplicate": False,
+        "timings": timings
+    }
+
+
+# user_id -> (время создания, страницы по (cursor, limit, full))
+_orders_cache: "OrderedDict[int, Tuple[float, OrderedDict]]" = OrderedDict()
+_orders_cache_lock = threading.Lock()
+
+
+def invalidate_user_orders(user_id: int) -> None:
+    """Drop cached order history pages of a user."""
+    with _orders_cache_lock:
+        _orders_cache.pop(user_id, None)
+
+
+def _cached_page(user_id: int, key: Any) -> Optional[Dict[str, Any]]:
+    with _orders_cache_lock:
+        entry = _orders_cache.get(user_id)
+        if entry is None:
+            return None
+        created, pages = entry
+        if time.monotonic() - created > ORDERS_CACHE_TTL:
+            del _orders_cache[user_id]
+            return None
+        _orders_cache.move_to_end(user_id)
+        page = pages.get(key)
+        if page is not None:
+            pages.move_to_end(key)
+        return page
+
+
+def _store_page(user_id: int, key: Any, page: Dict[str, Any]) -> None:
+    with _orders_cache_lock:
+        entry = _orders_cache.get(user_id)
+        if entry is None:
+            entry = (time.monotonic(), OrderedDict())
+            _orders_cache[user_id] = entry
+        pages = entry[1]
+        pages[key] = page
+        pages.move_to_end(key)
+        while len(pages) > ORDERS_CACHE_MAX_PAGES:
+            pages.popitem(last=False)
+        _orders_cache.move_to_end(user_id)
+        while len(_orders_cache) > ORDERS_CACHE_MAX_USERS:
+            _orders_cache.popitem(last=False)
+
+
+def encode_cursor(created_at: str, order_id: int) -> str:
+    """Encode keyset position of the last order on a page."""
+    raw = json.dumps([created_at, order_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """Decode cursor produced by encode_cursor.
+
+    Raises ValueError for malformed cursors.
+    """
+    try:
+        created_at, order_id = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+        return str(created_at), int(order_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def list_user_orders(
+    user_id: int,
+    limit: int = ORDERS_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    full: bool = False
+) -> Dict[str, Any]:
+    """Get one page of user's orders, newest first.
+
+    Pagination is keyset-based on (created_at, id), so each page is an
+    index range scan regardless of its depth. By default only summary
+    columns are returned; full=True also includes parsed order_data.
+    Raises ValueError for invalid cursor.
+    """
+    limit = max(1, min(int(limit), ORDERS_PAGE_SIZE_MAX))
+    cache_key = (cursor, limit, full)
+    page = _cached_page(user_id, cache_key)
+    if page is not None:
+        return page
+
+    columns = "id, total_amount, status, created_at"
+    if full:
+        columns += ", order_data"
+    query = f"SELECT {columns} FROM orders WHERE user_id = ?"
+    params: List[Any] = [user_id]
+    if cursor:
+        created_at, order_id = decode_cursor(cursor)
+        query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+        params += [created_at, created_at, order_id]
+    query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+
+    with stage("db"), get_db_connection() as conn:
+        _ensure_schema(conn)
+        rows = conn.execute(query, params).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    orders = []
+    for row in rows:
+        order = {
+            "id": row[0],
+            "total_amount": row[1],
+            "status": row[2],
+            "created_at": row[3]
+        }
+        if full:
+            order["order_data"] = loads(row[4]) if row[4] else {}
+        orders.append(order)
+
+    next_cursor = None
+    if has_more and rows:
+        next_cursor = encode_cursor(rows[-1][3], rows[-1][0])
+
+    page = {"orders": orders, "next_cursor": next_cursor}
+    _store_page(user_id, cache_key, page)
+    return page
+
+
+def get_user_order(user_id: int, order_id: int) -> Optional[Dict[str, Any]]:
+    """Get single user's order with parsed order_data."""
+    with stage("db"), get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT id, total_amount, status, created_at, order_data "
+            "FROM orders WHERE id = ? AND user_id = ?",
+            (order_id, user_id)
+        ).fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row[0],
+        "total_amount": row[1],
+        "status": row[2],
+        "created_at": row[3],
+        "order_data": loads(row[4]) if row[4] else {}
+    }
@@ -0,0 +1,164 @@
+"""Cart pricing engine working in exact integer kopecks."""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from webapp.catalog import CatalogSnapshot
+
+# (product_id, quantity, product, сумма строки в копейках или None)
+PricedLine = Tuple[str, int, Dict[str, Any], Optional[int]]
+
+_KOPECKS = Decimal(100)
+_ONE = Decimal(1)
+# Цены выше считаем ошибкой данных (и не даем quantize переполниться)
+MAX_PRICE_KOPECKS = 10 ** 12
+
+
+def to_kopecks(value: Any) -> Optional[int]:
+    """Convert price like 199, "199.90", "199,9" or "1 199" to kopecks.
+
+    Returns None for missing, malformed, negative or absurdly large
+    (over MAX_PRICE_KOPECKS) prices.
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        text = str(value).replace(" ", "").replace("\xa0", "")
+        amount = Decimal(text.replace(",", "."))
+        if not amount.is_finite() or amount < 0:
+            return None
+        kopecks = int(
+            (amount * _KOPECKS).quantize(_ONE, rounding=ROUND_HALF_UP)
+        )
+    except (InvalidOperation, ValueError):
+        return None
+    if kopecks > MAX_PRICE_KOPECKS:
+        return None
+    return kopecks
+
+
+def to_rubles(kopecks: int) -> float:
+    """Convert kopecks to rubles for JSON responses and orders table."""
+    return kopecks / 100
+
+
+# Тариф доставки зависит только от суммы, поэтому таблица заполняется
+# по мере появления новых сумм корзин
+@lru_cache(maxsize=4096)
+def delivery_cost_kopecks(subtotal_kopecks: int) -> int:
+    """Delivery cost for subtotal, memoized per distinct subtotal.
+
+    Raises RuntimeError if the tariff returns something that is not
+    a valid amount.
+    """
+    from utils.delivery import calculate_delivery_cost
+    cost = calculate_delivery_cost(to_rubles(subtotal_kopecks))
+    kopecks = to_kopecks(cost)
+    if kopecks is None:
+        raise RuntimeError(f"Некорректная стоимость доставки: {cost!r}")
+    return kopecks
+
+
+def price_lines(
+    items: Iterable[Tuple[str, int]],
+    catalog: Optional["CatalogSnapshot"]
+) -> Tuple[List[PricedLine], int, List[str], List[str]]:
+    """Price cart lines in one pass.
+
+    Returns ((product_id, quantity, product, line total), subtotal,
+    unpriced ids, missing ids), amounts in kopecks. Products missing
+    from catalog (all of them if it is not loaded) get no line;
+    products without a valid price get line total None. Neither is
+    counted in subtotal.
+    """
+    lines = []
+    subtotal = 0
+    unpriced = []
+    missing = []
+    if catalog is None:
+        return lines, subtotal, unpriced, [str(p) for p, _ in items]
+    by_id = catalog.by_id
+    prices = catalog.prices
+    for product_id, quantity in items:
+        product_id = str(product_id)
+        product = by_id.get(product_id)
+        if product is None:
+            missing.append(product_id)
+            continue
+        unit_price = prices[product_id]
+        if unit_price is None:
+            unpriced.append(product_id)
+            lines.append((product_id, quantity, product, None))
+            continue
+        line_total = unit_price * quantity
+        subtotal += line_total
+        lines.append((product_id, quantity, product, line_total))
+    return lines, subtotal, unpriced, missing
+
+
+def cart_subtotal(
+    items: Iterable[Tuple[str, int]],
+    catalog: Optional["CatalogSnapshot"]
+) -> Tuple[int, List[str], List[str]]:
+    """Cart subtotal in kopecks, unpriced and missing ids, without lines."""
+    subtotal = 0
+    unpriced = []
+    missing = []
+    if catalog is None:
+        return subtotal, unpriced, [str(p) for p, _ in items]
+    prices = catalog.prices
+    for product_id, quantity in items:
+        product_id = str(product_id)
+        if product_id not in prices:
+            missing.append(product_id)
+            continue
+        unit_price = prices[product_id]
+        if unit_price is None:
+            unpriced.append(product_id)
+        else:
+            subtotal += unit_price * quantity
+    return subtotal, unpriced, missing
+
+
+def quote_cart(
+    items: Iterable[Tuple[str, int]],
+    catalog: Optional["CatalogSnapshot"],
+    with_delivery: bool = True,
+    with_lines: bool = True
+) -> Dict[str, Any]:
+    """Compute subtotal, delivery and total for cart items.
+
+    Amounts are summed in kopecks; float fields in rubles are derived
+    from them for JSON responses. "unpriced" lists products that cannot
+    be sold because their catalog price is invalid, "missing" lists
+    products absent from catalog (or all of them if it is not loaded).
+    """
+    if with_lines:
+        lines, subtotal, unpriced, missing = price_lines(items, catalog)
+    else:
+        lines = []
+        subtotal, unpriced, missing = cart_subtotal(items, catalog)
+    delivery = delivery_cost_kopecks(subtotal) if with_delivery else 0
+    total = subtotal + delivery
+    return {
+        "lines": lines,
+        "unpriced": unpriced,
+        "missing": missing,
+        "subtotal_kopecks": subtotal,
+        "delivery_kopecks": delivery,
+        "total_kopecks": total,
+        "subtotal": to_rubles(subtotal),
+        "delivery_cost": to_rubles(delivery),
+        "total": to_rubles(total)
+    }
+
+
+def pricing_stats() -> Dict[str, Any]:
+    """Get delivery tariff table counters."""
+    info = delivery_cost_kopecks.cache_info()
+    return {
+        "tariff_hits": info.hits,
+        "tariff_misses": info.misses,
+        "tariff_size": info.currsize
+    }
@@ -0,0 +1,228 @@
+"""Runtime-toggleable profiling for Mini App server.
+
+When profiling is off the middleware and stage timers return
+immediately, so the hooks can stay in hot paths permanently.
+"""
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from config.settings import logger
+
+SLOW_REQUEST_MS = 500.0
+SLOW_REQUESTS_KEPT = 20
+LOOP_LAG_INTERVAL = 0.25
+LOOP_LAG_WARNING_MS = 100.0
+SAMPLING_INTERVAL = 0.005
+# Сэмплы за последние ~10 секунд при интервале 5 мс
+SAMPLES_KEPT = 2000
+STACK_DEPTH = 30
+PROFILE_TOP = 15
+# Долгоживущие потоки событий не считаем медленными запросами
+PROFILE_SKIP_PATHS = frozenset({"/api/events"})
+DEBUG_TOKEN_HEADER = "X-Debug-Token"
+# Без токена отладочные эндпоинты недоступны
+DEBUG_TOKEN = os.getenv("WEBAPP_DEBUG_TOKEN", "")
+
+_enabled = os.getenv("WEBAPP_PROFILING", "0") == "1"
+_slow_ms = SLOW_REQUEST_MS
+_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "webapp_profile_stages", default=None
+)
+_NULL_STAGE = nullcontext()
+_slow_requests: Deque[Dict[str, Any]] = deque(maxlen=SLOW_REQUESTS_KEPT)
+_loop_lag: Deque[float] = deque(maxlen=240)
+_lag_task: Optional["asyncio.Future[None]"] = None
+_sampler: Optional["_Sampler"] = None
+
+
+class _Stage:
+    """Adds elapsed time to a named stage of the current request."""
+
+    __slots__ = ("stages", "name", "started")
+
+    def __init__(self, stages: Dict[str, float], name: str):
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        elapsed = (time.perf_counter() - self.started) * 1000
+        self.stages[self.name] = self.stages.get(self.name, 0.0) + elapsed
+
+
+def stage(name: str):
+    """Time a block as request stage ("db", "parse", "serialize", ...)."""
+    stages = _stages.get()
+    if stages is None:
+        return _NULL_STAGE
+    return _Stage(stages, name)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return (
+        f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+        f"{frame.f_lineno})"
+    )
+
+
+class _Sampler(threading.Thread):
+    """Samples event loop thread stack into a ring buffer."""
+
+    def __init__(self, thread_id: int):
+        super().__init__(name="webapp-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.samples: Deque[Tuple[float, Tuple[str, ...]]] = deque(
+            maxlen=SAMPLES_KEPT
+        )
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(SAMPLING_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < STACK_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.samples.append((time.perf_counter(), tuple(stack)))
+
+    def profile(self, started: float, finished: float) -> Dict[str, Any]:
+        """Aggregate samples taken while a request was running."""
+        stacks = [
+            stack for taken, stack in list(self.samples)
+            if started <= taken <= finished and stack
+        ]
+        top_frames = Counter(stack[0] for stack in stacks)
+        collapsed = Counter(";".join(reversed(stack)) for stack in stacks)
+        return {
+            "samples": len(stacks),
+            "top_frames": top_frames.most_common(PROFILE_TOP),
+            "top_stacks": collapsed.most_common(5),
+        }
+
+
+async def _monitor_loop_lag() -> None:
+    """Measure how late the event loop wakes up a sleeping task."""
+    while True:
+        expected = time.perf_counter() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+        _loop_lag.append(lag_ms)
+        if lag_ms > LOOP_LAG_WARNING_MS:
+            logger.warning("Event loop заблокирован на %.0f мс", lag_ms)
+
+
+def set_profiling(
+    enabled: bool,
+    sampling: bool = False,
+    slow_ms: Optional[float] = None
+) -> None:
+    """Turn profiling on or off. Must be called from event loop thread.
+
+    Raises ValueError for invalid slow_ms; nothing is changed then.
+    """
+    global _enabled, _lag_task, _sampler, _slow_ms
+    if slow_ms is not None:
+        try:
+            slow_ms = float(slow_ms)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid slow_ms: {slow_ms!r}") from e
+        if not 0 <= slow_ms < float("inf"):
+            raise ValueError(f"Invalid slow_ms: {slow_ms!r}")
+        _slow_ms = slow_ms
+    _enabled = enabled
+
+    if enabled and (_lag_task is None or _lag_task.done()):
+        _lag_task = asyncio.ensure_future(_monitor_loop_lag())
+    elif not enabled and _lag_task is not None:
+        _lag_task.cancel()
+        _lag_task = None
+
+    if enabled and sampling and _sampler is None:
+        _sampler = _Sampler(threading.get_ident())
+        _sampler.start()
+    elif (not enabled or not sampling) and _sampler is not None:
+        _sampler.stopped.set()
+        _sampler = None
+    logger.info(
+        "Профилирование Mini App: %s (сэмплирование: %s, порог %.0f мс)",
+        "включено" if enabled else "выключено",
+        "да" if _sampler is not None else "нет",
+        _slow_ms
+    )
+
+
+@web.middleware
+async def profiling_middleware(request: web.Request, handler):
+    """Time request stages and keep slow requests with their profiles."""
+    if not _enabled or request.path in PROFILE_SKIP_PATHS:
+        return await handler(request)
+
+    stages: Dict[str, float] = {}
+    token = _stages.set(stages)
+    started = time.perf_counter()
+    try:
+        return await handler(request)
+    finally:
+        finished = time.perf_counter()
+        _stages.reset(token)
+        total_ms = (finished - started) * 1000
+        if total_ms >= _slow_ms:
+            record = {
+                "method": request.method,
+                "path": request.path,
+                "at": time.time(),
+                "total_ms": round(total_ms, 2),
+                "stages": {k: round(v, 2) for k, v in stages.items()},
+            }
+            sampler = _sampler
+            if sampler is not None:
+                record["profile"] = sampler.profile(started, finished)
+            _slow_requests.append(record)
+
+
+def debug_allowed(request: web.Request) -> bool:
+    """Check debug token of request."""
+    token = request.headers.get(DEBUG_TOKEN_HEADER, "")
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(token, DEBUG_TOKEN)
+
+
+async def start_profiling(app: web.Application) -> None:
+    """on_startup hook: start monitors if enabled via WEBAPP_PROFILING."""
+    if _enabled:
+        set_profiling(True)
+
+
+async def stop_profiling(app: web.Application) -> None:
+    """on_cleanup hook: stop monitors."""
+    if _lag_task is not None or _sampler is not None:
+        set_profiling(False)
+
+
+def profiling_report(limit: int = SLOW_REQUESTS_KEPT) -> Dict[str, Any]:
+    """Get loop lag summary and the last slow requests."""
+    lags = sorted(_loop_lag)
+    slow: List[Dict[str, Any]] = list(_slow_requests)[-limit:] if limit else []
+    return {
+        "enabled": _enabled,
+        "sampling": _sampler is not None,
+        "slow_ms": _slow_ms,
+        "loop_lag_ms": {
+            "last": round(_loop_lag[-1], 2) if _loop_lag else None,
+            "p50": round(lags[len(lags) // 2], 2) if lags else None,
+            "p99": round(lags[int(len(lags) * 0.99)], 2) if lags else None,
+            "max": round(lags[-1], 2) if lags else None,
+        },
+        "slow_requests": slow,
+    }
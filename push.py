@@ -0,0 +1,167 @@
+"""Server-sent events pushing catalog deltas and cart updates to Mini App."""
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+from aiohttp import web
+from config.settings import logger
+from webapp.cart_cache import get_enriched_cart
+from webapp.catalog import (
+    CATALOG_REFRESH_INTERVAL, CatalogSnapshot, diff_catalogs, get_catalog
+)
+from webapp.rate_limit import client_ip
+from webapp.serialization import dumps, json_response
+
+SSE_HEARTBEAT_INTERVAL = 25.0
+# Медленный клиент не должен копить события без ограничений
+SSE_QUEUE_SIZE = 50
+# Окна Mini App одного пользователя и соединения с одного IP
+SSE_MAX_CONNECTIONS_PER_USER = 5
+SSE_MAX_CONNECTIONS_PER_IP = 20
+
+# user_id -> очереди открытых соединений (0 - пользователь неизвестен)
+_clients: Dict[int, Set["asyncio.Queue[bytes]"]] = {}
+_connections_by_ip: Dict[str, int] = {}
+_watcher: Optional["asyncio.Future[None]"] = None
+_stats = {"connections": 0, "events": 0, "resyncs": 0, "refused": 0}
+
+
+def _encode_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+def _send(queue: "asyncio.Queue[bytes]", message: bytes) -> None:
+    """Queue message, asking client to reload if it fell behind."""
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_encode_event("resync", {}))
+        _stats["resyncs"] += 1
+    _stats["events"] += 1
+
+
+def broadcast(event: str, data: Any) -> None:
+    """Send event to every connected client."""
+    if not _clients:
+        return
+    message = _encode_event(event, data)
+    for queues in _clients.values():
+        for queue in queues:
+            _send(queue, message)
+
+
+def publish_cart(user_id: int) -> None:
+    """Push user's current enriched cart to their open Mini App windows."""
+    queues = _clients.get(user_id)
+    if not queues:
+        return
+    message = _encode_event("cart", get_enriched_cart(user_id))
+    for queue in queues:
+        _send(queue, message)
+
+
+async def stream_events(
+    request: web.Request, user_id: Optional[int]
+) -> web.StreamResponse:
+    """Stream events to one client until it disconnects.
+
+    user_id must come from verified initData: cart events of that user
+    are sent to the stream. Clients over connection caps get 429.
+    """
+    key = user_id or 0
+    ip = client_ip(request)
+    user_connections = len(_clients.get(key, ())) if key else 0
+    if (
+        user_connections >= SSE_MAX_CONNECTIONS_PER_USER or
+        _connections_by_ip.get(ip, 0) >= SSE_MAX_CONNECTIONS_PER_IP
+    ):
+        _stats["refused"] += 1
+        return json_response(
+            {"success": False, "error": "Too many connections"},
+            status=429,
+            headers={"Access-Control-Allow-Origin": "*"}
+        )
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "Access-Control-Allow-Origin": "*",
+    })
+    queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=SSE_QUEUE_SIZE)
+    _clients.setdefault(key, set()).add(queue)
+    _connections_by_ip[ip] = _connections_by_ip.get(ip, 0) + 1
+    _stats["connections"] += 1
+    try:
+        await response.prepare(request)
+        catalog = get_catalog()
+        await response.write(_encode_event("hello", {
+            "version": catalog.version if catalog is not None else None
+        }))
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), SSE_HEARTBEAT_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                message = b": ping\n\n"
+            await response.write(message)
+    except ConnectionResetError:
+        pass
+    finally:
+        queues = _clients.get(key)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del _clients[key]
+        remaining = _connections_by_ip.get(ip, 1) - 1
+        if remaining > 0:
+            _connections_by_ip[ip] = remaining
+        else:
+            _connections_by_ip.pop(ip, None)
+    return response
+
+
+async def _watch_catalog() -> None:
+    """Poll catalog snapshot and broadcast deltas when it changes."""
+    loop = asyncio.get_running_loop()
+    last: Optional[CatalogSnapshot] = None
+    while True:
+        try:
+            catalog = await loop.run_in_executor(None, get_catalog)
+            if (
+                catalog is not None and last is not None and
+                catalog.version != last.version
+            ):
+                delta = diff_catalogs(last, catalog)
+                logger.info(
+                    "Каталог изменился (версия %d): изменено %d, удалено %d",
+                    catalog.version, len(delta["changed"]),
+                    len(delta["removed"])
+                )
+                broadcast("catalog", delta)
+            if catalog is not None:
+                last = catalog
+        except Exception as e:
+            logger.error("Ошибка отслеживания каталога: %s", e)
+        await asyncio.sleep(CATALOG_REFRESH_INTERVAL)
+
+
+async def start_catalog_watcher(app: web.Application) -> None:
+    """on_startup hook: start catalog delta broadcaster."""
+    global _watcher
+    _watcher = asyncio.ensure_future(_watch_catalog())
+
+
+async def stop_catalog_watcher(app: web.Application) -> None:
+    """on_cleanup hook: stop catalog delta broadcaster."""
+    if _watcher is not None and not _watcher.done():
+        _watcher.cancel()
+
+
+def push_stats() -> Dict[str, Any]:
+    """Get SSE connection and event counters."""
+    stats = dict(_stats)
+    stats["open_connections"] = sum(len(q) for q in _clients.values())
+    return stats
@@ -0,0 +1,143 @@
+"""Token-bucket rate limiting for Mini App API."""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from webapp.auth import verify_request
+from webapp.serialization import json_response
+
+# Бюджеты маршрутов: (емкость корзины, пополнение токенов в секунду)
+ROUTE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "/api/search": (20, 1.0),
+    "/api/cart": (30, 2.0),
+    "/api/order": (5, 5 / 60),
+    "/api/orders": (30, 1.0),
+    "/api/ai/chat": (5, 5 / 60),
+    "/api/wholesale": (3, 3 / 600),
+    # Переподключения EventSource
+    "/api/events": (10, 10 / 60),
+}
+# За одним IP могут быть несколько пользователей (NAT, мобильные сети)
+IP_LIMIT_MULTIPLIER = 5
+# Прокси (nginx), которым доверяем X-Forwarded-For, через запятую
+TRUSTED_PROXIES = frozenset(
+    ip.strip()
+    for ip in os.getenv("WEBAPP_TRUSTED_PROXIES", "127.0.0.1,::1").split(",")
+    if ip.strip()
+)
+RATE_LIMIT_MAX_BUCKETS = 50000
+# Сколько самых старых корзин проверяем на простой за один запрос
+IDLE_EVICTION_BATCH = 4
+
+_buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+_stats = {"allowed": 0, "rejected": 0, "evicted": 0}
+
+
+def _route_for(path: str) -> Optional[str]:
+    """Map request path to its rate limit group."""
+    if path in ROUTE_LIMITS:
+        return path
+    parent = path.rsplit("/", 1)[0]
+    if parent in ROUTE_LIMITS:
+        return parent
+    return None
+
+
+def _evict_idle(now: float) -> None:
+    """Drop least recently used buckets that are full again or over limit."""
+    for _ in range(IDLE_EVICTION_BATCH):
+        if not _buckets:
+            return
+        key, bucket = next(iter(_buckets.items()))
+        capacity, refill_rate = bucket[2], bucket[3]
+        idle_for = now - bucket[1]
+        if (
+            len(_buckets) <= RATE_LIMIT_MAX_BUCKETS and
+            bucket[0] + idle_for * refill_rate < capacity
+        ):
+            return
+        del _buckets[key]
+        _stats["evicted"] += 1
+
+
+def _take(
+    key: Tuple[str, str], capacity: float, refill_rate: float, now: float
+) -> float:
+    """Take a token from bucket, return 0 or seconds until next token."""
+    bucket = _buckets.get(key)
+    if bucket is None:
+        # [токены, время последнего обновления, емкость, скорость]
+        bucket = [capacity, now, capacity, refill_rate]
+        _buckets[key] = bucket
+    else:
+        _buckets.move_to_end(key)
+        bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill_rate)
+        bucket[1] = now
+    if bucket[0] >= 1:
+        bucket[0] -= 1
+        return 0
+    return (1 - bucket[0]) / refill_rate
+
+
+def client_ip(request: web.Request) -> str:
+    """Get client address, looking through trusted proxies."""
+    remote = request.remote or ""
+    if remote not in TRUSTED_PROXIES:
+        return remote
+    forwarded = request.headers.get("X-Forwarded-For", "")
+    # Справа налево: последний адрес, добавленный не нашим прокси
+    for ip in reversed([ip.strip() for ip in forwarded.split(",")]):
+        if ip and ip not in TRUSTED_PROXIES:
+            return ip
+    return remote
+
+
+@web.middleware
+async def rate_limit_middleware(request: web.Request, handler):
+    """Reject requests over route budget before any other work."""
+    route = _route_for(request.path)
+    if route is None or request.method == "OPTIONS":
+        return await handler(request)
+
+    capacity, refill_rate = ROUTE_LIMITS[route]
+    now = time.monotonic()
+    _evict_idle(now)
+    # Проверенный пользователь расходует только свой бюджет, анонимные
+    # запросы - общий бюджет своего IP. Результат проверки initData
+    # остается в запросе и повторно используется auth_middleware
+    user_id = verify_request(request)
+    if user_id is not None:
+        retry_after = _take(
+            (route, "user:" + str(user_id)), capacity, refill_rate, now
+        )
+    else:
+        retry_after = _take(
+            (route, "ip:" + client_ip(request)),
+            capacity * IP_LIMIT_MULTIPLIER,
+            refill_rate * IP_LIMIT_MULTIPLIER,
+            now
+        )
+
+    if retry_after:
+        _stats["rejected"] += 1
+        return json_response(
+            {"success": False, "error": "Too many requests"},
+            status=429,
+            headers={
+                "Retry-After": str(int(retry_after) + 1),
+                "Access-Control-Allow-Origin": "*"
+            }
+        )
+
+    _stats["allowed"] += 1
+    return await handler(request)
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """Get rate limiter counters."""
+    stats = dict(_stats)
+    stats["buckets"] = len(_buckets)
+    return stats
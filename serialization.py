@@ -0,0 +1,61 @@
+"""JSON serialization for Mini App API (orjson with stdlib fallback)."""
+import json
+from typing import Any, Mapping, Optional, Union
+
+from aiohttp import web
+from webapp.profiling import stage
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+# orjson.JSONDecodeError наследуется от json.JSONDecodeError
+JSONDecodeError = json.JSONDecodeError
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON from str or bytes."""
+    with stage("parse"):
+        if orjson is not None:
+            return orjson.loads(data)
+        return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize object to UTF-8 JSON bytes."""
+    with stage("serialize"):
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # Например, int больше 64 бит: stdlib справится
+                pass
+        return _stdlib_dumps(obj)
+
+
+def dumps_str(obj: Any) -> str:
+    """Serialize object to JSON string (for storing in DB)."""
+    return dumps(obj).decode("utf-8")
+
+
+def json_response(
+    data: Any,
+    *,
+    status: int = 200,
+    headers: Optional[Mapping[str, str]] = None
+) -> web.Response:
+    """Drop-in replacement for web.json_response using fast serializer."""
+    return web.Response(
+        body=dumps(data),
+        status=status,
+        headers=headers,
+        content_type="application/json",
+        charset="utf-8"
+    )
@@ -1,94 +1,151 @@
 """Web server for Telegram Mini App."""
-import json
+import os
 import sqlite3
 import aiohttp
 from aiohttp import web
 from aiohttp.web import Response
 from config.settings import logger
 from database.connection import get_db_connection
+from webapp.assets import (
+    INDEX_PATH, STATIC_CONTENT_TYPES, STATIC_DIR, get_faq_body, read_asset
+)
+from webapp.auth import (
+    INIT_DATA_HEADER, STREAM_TOKEN_TTL, auth_middleware, auth_stats,
+    check_auth_settings, issue_stream_token, resolve_user_id
+)
+from webapp.cart_cache import (
+    cart_cache_stats, cart_line_changed, get_cart_items, get_enriched_cart
+)
+from webapp.catalog import get_catalog
+from webapp.faq_matcher import answer_from_faq, faq_matcher_stats
+from webapp.orders import (
+    IDEMPOTENCY_KEY_MAX_LENGTH, ORDERS_PAGE_SIZE, get_user_order,
+    list_user_orders, place_order
+)
+from webapp.pricing import pricing_stats, quote_cart, to_rubles
+from webapp.profiling import (
+    debug_allowed, profiling_middleware, profiling_report, set_profiling,
+    stage, start_profiling, stop_profiling
+)
+from webapp.push import (
+    publish_cart, push_stats, start_catalog_watcher, stop_catalog_watcher,
+    stream_events
+)
+from webapp.rate_limit import rate_limit_middleware, rate_limit_stats
+from webapp.serialization import JSONDecodeError, json_response, loads
+from webapp.subscriptions import (
+    is_subscribed, set_subscription, subscriptions_stats
+)
+from webapp.warmup import start_warmup, stop_warmup, warmup_state
+
+# Ограничение на размер корзины в запросе расчета стоимости
+QUOTE_MAX_ITEMS = 200
 
 
 async def get_products(request: web.Request) -> Response:
     """Get all products for Mini App."""
     logger.info("Запрос товаров для Mini App от %s", request.remote)
     try:
-        with get_db_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute(
-                "SELECT content FROM products_cache WHERE key = 'products'"
+        try:
+            catalog = get_catalog()
+        except JSONDecodeError as e:
+            logger.error("❌ Ошибка парсинга JSON товаров: %s", e)
+            return json_response(
+                {"success": False, "error": "Invalid products data"},
+                status=500
             )
-            row = c.fetchone()
-            if row and row['content']:
-                try:
-                    products = json.loads(row['content'])
-                    logger.info(
-                        "✅ Загружено %d товаров для Mini App", len(products)
-                    )
-                    return web.json_response({
-                        "success": True,
-                        "products": products,
-                        "count": len(products)
-                    })
-                except json.JSONDecodeError as e:
-                    logger.error("❌ Ошибка парсинга JSON товаров: %s", e)
-                    return web.json_response(
-                        {"success": False, "error": "Invalid products data"},
-                        status=500
-                    )
-            logger.warning(
-                "⚠️ Товары не найдены в кэше. "
-                "Проверьте, что бот запущен и каталог загружен."
+        if catalog is not None:
+            products = catalog.products
+            logger.info(
+                "✅ Загружено %d товаров для Mini App", len(products)
             )
-            return web.json_response({
-                "success": False,
-                "error": (
-                    "Products not found. Please wait for catalog to load."
-                ),
-                "products": [],
-                "count": 0
+            return json_response({
+                "success": True,
+                "products": products,
+                "count": len(products),
+                "version": catalog.version
             })
+        logger.warning(
+            "⚠️ Товары не найдены в кэше. "
+            "Проверьте, что бот запущен и каталог загружен."
+        )
+        return json_response({
+            "success": False,
+            "error": (
+                "Products not found. Please wait for catalog to load."
+            ),
+            "products": [],
+            "count": 0
+        })
     except Exception as e:
         logger.error(
             "❌ Ошибка получения товаров для Mini App: %s",
             e, exc_info=True
         )
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e), "products": [], "count": 0},
             status=500
         )
 
 
+async def get_product_api(request: web.Request) -> Response:
+    """Get single product by id."""
+    try:
+        catalog = get_catalog()
+        product = (
+            catalog.get(request.match_info['product_id'])
+            if catalog is not None else None
+        )
+        if product is None:
+            return json_response(
+                {"success": False, "error": "Product not found"},
+                status=404
+            )
+        return json_response({
+            "success": True,
+            "product": product,
+            "version": catalog.version
+        })
+    except Exception as e:
+        logger.error("Ошибка получения товара: %s", e)
+        return json_response(
+            {"success": False, "error": str(e)},
+            status=500
+        )
+
+
 async def get_categories(request: web.Request) -> Response:
     """Get all categories for Mini App."""
     try:
         with get_db_connection() as conn:
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
-            c.execute(
-                "SELECT content FROM categories_cache WHERE key = 'categories'"
-            )
-            row = c.fetchone()
+            with stage("db"):
+                c.execute(
+                    "SELECT content FROM categories_cache "
+                    "WHERE key = 'categories'"
+                )
+                row = c.fetchone()
             if row and row['content']:
                 try:
-                    categories = json.loads(row['content'])
+                    categories = loads(row['content'])
                     logger.info(
                         "Загружено %d категорий для Mini App",
                         len(categories)
                     )
-                    return web.json_response({
+                    return json_response({
                         "success": True,
                         "categories": categories,
                         "count": len(categories)
                     })
-                except json.JSONDecodeError as e:
+                except JSONDecodeError as e:
                     logger.error("Ошибка парсинга JSON категорий: %s", e)
-                    return web.json_response(
+                    return json_response(
                         {"success": False, "error": "Invalid categories data"},
                         status=500
                     )
             logger.warning("Категории не найдены в кэше")
-            return web.json_response({
+            return json_response({
                 "success": False,
                 "error": (
                     "Categories not found. Please wait for catalog to load."
@@ -101,7 +158,7 @@ async def get_categories(request: web.Request) -> Response:
             "Ошибка получения категорий для Mini App: %s",
             e, exc_info=True
         )
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e), "categories": [], "count": 0},
             status=500
         )
@@ -110,67 +167,79 @@ async def get_categories(request: web.Request) -> Response:
 async def get_cart(request: web.Request) -> Response:
     """Get user's cart for Mini App."""
     try:
-        user_id = request.query.get('user_id')
+        user_id = resolve_user_id(request, request.query.get('user_id'))
         if not user_id:
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "user_id required"},
                 status=400
             )
 
-        user_id = int(user_id)
+        cart = get_enriched_cart(int(user_id))
 
-        with get_db_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute(
-                "SELECT product_id, quantity FROM cart WHERE user_id = ?",
-                (user_id,)
-            )
-            cart_items = [
-                {"product_id": row['product_id'], "quantity": row['quantity']}
-                for row in c.fetchall()
-            ]
-
-            # Получаем информацию о товарах
-            c.execute(
-                "SELECT content FROM products_cache WHERE key = 'products'"
-            )
-            row = c.fetchone()
-            products_dict = {}
-            if row:
-                products = json.loads(row['content'])
-                products_dict = {p["id"]: p for p in products}
-
-            # Обогащаем корзину данными о товарах
-            cart_with_products = []
-            total = 0
-            for item in cart_items:
-                product = products_dict.get(item['product_id'])
-                if product:
-                    try:
-                        price = float(product.get("price", 0))
-                        subtotal = price * item['quantity']
-                        total += subtotal
-                        cart_with_products.append({
-                            **item,
-                            "product": product,
-                            "subtotal": subtotal
-                        })
-                    except (ValueError, TypeError):
-                        cart_with_products.append({
-                            **item,
-                            "product": product,
-                            "subtotal": 0
-                        })
-
-            return web.json_response({
-                "success": True,
-                "cart": cart_with_products,
-                "total": total
-            })
+        return json_response({"success": True, **cart})
     except Exception as e:
         logger.error("Ошибка получения корзины для Mini App: %s", e)
-        return web.json_response(
+        return json_response(
+            {"success": False, "error": str(e)},
+            status=500
+        )
+
+
+async def quote_cart_api(request: web.Request) -> Response:
+    """Quote subtotal, delivery and total for cart or given items."""
+    try:
+        data = await request.json(loads=loads)
+        items = data.get('items')
+        if items is None:
+            user_id = resolve_user_id(request, data.get('user_id'))
+            if not user_id:
+                return json_response(
+                    {"success": False, "error": "user_id or items required"},
+                    status=400
+                )
+            cart_items = get_cart_items(int(user_id))
+        else:
+            if not isinstance(items, list) or len(items) > QUOTE_MAX_ITEMS:
+                return json_response(
+                    {"success": False, "error": "Invalid items"},
+                    status=400
+                )
+            try:
+                cart_items = [
+                    (str(item['product_id']), int(item.get('quantity', 1)))
+                    for item in items
+                ]
+            except (KeyError, TypeError, ValueError, AttributeError):
+                return json_response(
+                    {"success": False, "error": "Invalid items"},
+                    status=400
+                )
+            if any(quantity <= 0 for _, quantity in cart_items):
+                return json_response(
+                    {"success": False, "error": "Invalid quantity"},
+                    status=400
+                )
+
+        quote = quote_cart(cart_items, get_catalog())
+        return json_response({
+            "success": True,
+            "items": [
+                {
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "subtotal": to_rubles(line_total)
+                    if line_total is not None else None
+                }
+                for product_id, quantity, _, line_total in quote["lines"]
+            ],
+            "unpriced": quote["unpriced"],
+            "subtotal": quote["subtotal"],
+            "delivery_cost": quote["delivery_cost"],
+            "total": quote["total"]
+        })
+    except Exception as e:
+        logger.error("Ошибка расчета стоимости корзины: %s", e)
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -179,26 +248,29 @@ async def get_cart(request: web.Request) -> Response:
 async def add_to_cart_api(request: web.Request) -> Response:
     """Add product to cart via API."""
     try:
-        data = await request.json()
-        user_id = data.get('user_id')
+        data = await request.json(loads=loads)
+        user_id = resolve_user_id(request, data.get('user_id'))
         product_id = data.get('product_id')
         quantity = data.get('quantity', 1)
 
         if not user_id or not product_id:
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "user_id and product_id required"},
                 status=400
             )
 
         from database.cart import add_to_cart
         # Добавляем товар quantity раз
-        for _ in range(int(quantity)):
-            add_to_cart(int(user_id), str(product_id))
+        with stage("db"):
+            for _ in range(int(quantity)):
+                add_to_cart(int(user_id), str(product_id))
+        cart_line_changed(int(user_id), str(product_id))
+        publish_cart(int(user_id))
 
-        return web.json_response({"success": True})
+        return json_response({"success": True})
     except Exception as e:
         logger.error("Ошибка добавления в корзину через API: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -207,23 +279,26 @@ async def add_to_cart_api(request: web.Request) -> Response:
 async def remove_from_cart_api(request: web.Request) -> Response:
     """Remove product from cart via API."""
     try:
-        data = await request.json()
-        user_id = data.get('user_id')
+        data = await request.json(loads=loads)
+        user_id = resolve_user_id(request, data.get('user_id'))
         product_id = data.get('product_id')
 
         if not user_id or not product_id:
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "user_id and product_id required"},
                 status=400
             )
 
         from database.cart import remove_from_cart
-        remove_from_cart(int(user_id), str(product_id))
+        with stage("db"):
+            remove_from_cart(int(user_id), str(product_id))
+        cart_line_changed(int(user_id), str(product_id))
+        publish_cart(int(user_id))
 
-        return web.json_response({"success": True})
+        return json_response({"success": True})
     except Exception as e:
         logger.error("Ошибка удаления из корзины через API: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -232,13 +307,13 @@ async def remove_from_cart_api(request: web.Request) -> Response:
 async def update_cart_quantity_api(request: web.Request) -> Response:
     """Update product quantity in cart via API."""
     try:
-        data = await request.json()
-        user_id = data.get('user_id')
+        data = await request.json(loads=loads)
+        user_id = resolve_user_id(request, data.get('user_id'))
         product_id = data.get('product_id')
         quantity = data.get('quantity')
 
         if not user_id or not product_id or quantity is None:
-            return web.json_response(
+            return json_response(
                 {
                     "success": False,
                     "error": "user_id, product_id and quantity required"
@@ -247,12 +322,17 @@ async def update_cart_quantity_api(request: web.Request) -> Response:
             )
 
         from database.cart import update_cart_quantity
-        update_cart_quantity(int(user_id), str(product_id), int(quantity))
+        with stage("db"):
+            update_cart_quantity(
+                int(user_id), str(product_id), int(quantity)
+            )
+        cart_line_changed(int(user_id), str(product_id))
+        publish_cart(int(user_id))
 
-        return web.json_response({"success": True})
+        return json_response({"success": True})
     except Exception as e:
         logger.error("Ошибка обновления количества в корзине через API: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -261,62 +341,47 @@ async def update_cart_quantity_api(request: web.Request) -> Response:
 async def submit_order_api(request: web.Request) -> Response:
     """Submit order from Mini App."""
     try:
-        data = await request.json()
-        user_id = data.get('user_id')
+        data = await request.json(loads=loads)
+        user_id = resolve_user_id(request, data.get('user_id'))
         order_data = data.get('order_data')
 
         if not user_id or not order_data:
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "user_id and order_data required"},
                 status=400
             )
 
-        from database.orders import save_order
-        from database.cart import clear_cart, get_cart_items
-        from utils.delivery import calculate_delivery_cost
-
-        # Получаем корзину для расчета суммы
-        cart_items = get_cart_items(int(user_id))
-        products_dict = {}
-        total = 0
+        idempotency_key = data.get('idempotency_key')
+        if idempotency_key is not None:
+            idempotency_key = str(idempotency_key).strip()
+            if len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return json_response(
+                    {"success": False, "error": "idempotency_key too long"},
+                    status=400
+                )
 
-        # Загружаем товары для расчета
-        with get_db_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute(
-                "SELECT content FROM products_cache WHERE key = 'products'"
+        try:
+            result = place_order(
+                int(user_id), order_data, idempotency_key or None
             )
-            row = c.fetchone()
-            if row:
-                products = json.loads(row['content'])
-                products_dict = {p["id"]: p for p in products}
-
-        for product_id, quantity in cart_items:
-            product = products_dict.get(product_id)
-            if product:
-                try:
-                    price = float(product.get("price", 0))
-                    total += price * quantity
-                except (ValueError, TypeError):
-                    pass
-
-        delivery_cost = calculate_delivery_cost(total)
-        total_with_delivery = total + delivery_cost
-
-        # Сохраняем заказ
-        order_id = save_order(int(user_id), order_data, total_with_delivery)
-
-        # Очищаем корзину
-        clear_cart(int(user_id))
+        except ValueError as e:
+            return json_response(
+                {"success": False, "error": str(e)},
+                status=400
+            )
+        if not result["duplicate"]:
+            publish_cart(int(user_id))
 
-        return web.json_response({
+        return json_response({
             "success": True,
-            "order_id": order_id
+            "order_id": result["order_id"],
+            "total": result["total"],
+            "duplicate": result["duplicate"],
+            "timings": result["timings"]
         })
     except Exception as e:
         logger.error("Ошибка оформления заказа через API: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -329,25 +394,25 @@ async def serve_index(request: web.Request) -> Response:
         raise web.HTTPNotFound()
 
     try:
-        import os
-        file_path = "webapp/index.html"
-        if not os.path.exists(file_path):
+        try:
+            content = read_asset(INDEX_PATH)
+        except FileNotFoundError:
             logger.error(
                 "Файл index.html не найден: %s",
-                os.path.abspath(file_path)
+                os.path.abspath(INDEX_PATH)
             )
             return Response(
                 text=(
                     "<h1>Mini App not found</h1><p>File: " +
-                    file_path + "</p>"
+                    INDEX_PATH + "</p>"
                 ),
                 status=404,
                 content_type="text/html"
             )
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
         logger.debug("Отправка index.html")
-        return Response(text=content, content_type="text/html")
+        return Response(
+            body=content, content_type="text/html", charset="utf-8"
+        )
     except Exception as e:
         logger.error("Ошибка загрузки index.html: %s", e, exc_info=True)
         return Response(
@@ -370,15 +435,9 @@ async def serve_static(request: web.Request) -> Response:
         return Response(status=404)
 
     try:
-        file_ext = {
-            'css': 'text/css',
-            'js': 'application/javascript'
-        }.get(file_type, 'text/plain')
-
-        file_full_path = f"webapp/static/{file_type}/{file_path}"
-        with open(file_full_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        return Response(text=content, content_type=file_ext)
+        file_ext = STATIC_CONTENT_TYPES.get(file_type, 'text/plain')
+        content = read_asset(f"{STATIC_DIR}/{file_type}/{file_path}")
+        return Response(body=content, content_type=file_ext, charset="utf-8")
     except FileNotFoundError:
         return Response(status=404)
 
@@ -386,14 +445,14 @@ async def serve_static(request: web.Request) -> Response:
 async def get_faq(request: web.Request) -> Response:
     """Get FAQ questions and answers."""
     try:
-        from personality.faq import FAQ_QUESTIONS_ANSWERS
-        return web.json_response({
-            "success": True,
-            "faq": FAQ_QUESTIONS_ANSWERS
-        })
+        return Response(
+            body=get_faq_body(),
+            content_type="application/json",
+            charset="utf-8"
+        )
     except Exception as e:
         logger.error("Ошибка получения FAQ: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -404,43 +463,29 @@ async def search_products_api(request: web.Request) -> Response:
     try:
         query = request.query.get('q', '').strip()
         if not query:
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "Query required"},
                 status=400
             )
 
-        with get_db_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute(
-                "SELECT content FROM products_cache WHERE key = 'products'"
-            )
-            row = c.fetchone()
-            if not row:
-                return web.json_response(
-                    {"success": False, "error": "Products not found"},
-                    status=404
-                )
-
-            products = json.loads(row['content'])
-            query_lower = query.lower()
+        catalog = get_catalog()
+        if catalog is None:
+            return json_response(
+                {"success": False, "error": "Products not found"},
+                status=404
+            )
 
-            # Простой поиск по названию и описанию
-            matched = []
-            for product in products:
-                name = product.get("name", "").lower()
-                description = product.get("description", "").lower()
-                if query_lower in name or query_lower in description:
-                    matched.append(product)
+        # Простой поиск по названию и описанию
+        matched = catalog.search(query)
 
-            return web.json_response({
-                "success": True,
-                "products": matched,
-                "count": len(matched)
-            })
+        return json_response({
+            "success": True,
+            "products": matched,
+            "count": len(matched)
+        })
     except Exception as e:
         logger.error("Ошибка поиска товаров: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -455,36 +500,44 @@ async def ai_chat_api(request: web.Request) -> Response:
         request.path
     )
     try:
-        data = await request.json()
-        user_id = data.get('user_id')
+        data = await request.json(loads=loads)
+        user_id = resolve_user_id(request, data.get('user_id'))
         message = data.get('message', '').strip()
 
         if not user_id or not message:
             logger.warning("⚠️ AI чат: отсутствует user_id или message")
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "user_id and message required"},
                 status=400
             )
 
         logger.info("AI чат: user_id=%s, message=%s", user_id, message[:50])
 
-        # Получаем товары
-        with get_db_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute(
-                "SELECT content FROM products_cache WHERE key = 'products'"
+        # Типовые вопросы (доставка, контакты...) отвечаем из FAQ без модели
+        faq_match = answer_from_faq(message)
+        if faq_match is not None:
+            logger.info(
+                "AI чат: ответ из FAQ (%s, score=%.2f)",
+                faq_match["question"], faq_match["score"]
             )
-            row = c.fetchone()
-            products = []
-            if row:
-                products = json.loads(row['content'])
+            return json_response({
+                "success": True,
+                "reply": faq_match["reply"],
+                "recommended_products": [],
+                "product_ids": [],
+                "order_buttons_mode": False,
+                "source": "faq"
+            })
+
+        # Получаем товары
+        catalog = get_catalog()
+        products = catalog.products if catalog is not None else []
 
         logger.info("AI чат: загружено %d товаров", len(products))
 
         if not products:
             logger.warning("⚠️ AI чат: товары не найдены в кэше")
-            return web.json_response({
+            return json_response({
                 "success": True,
                 "reply": (
                     "Извините, каталог товаров еще не загружен. "
@@ -501,13 +554,14 @@ async def ai_chat_api(request: web.Request) -> Response:
 
         logger.info("AI чат: генерация ответа через AI service...")
         try:
-            async with aiohttp.ClientSession() as session:
-                (
-                    reply_text, recommended_products, product_ids,
-                    order_buttons_mode
-                ) = await generate_maxim_reply(
-                    message, session, products
-                )
+            with stage("upstream"):
+                async with aiohttp.ClientSession() as session:
+                    (
+                        reply_text, recommended_products, product_ids,
+                        order_buttons_mode
+                    ) = await generate_maxim_reply(
+                        message, session, products
+                    )
             logger.info(
                 "✅ AI чат: ответ сгенерирован, рекомендовано товаров: %d",
                 len(recommended_products) if recommended_products else 0
@@ -537,7 +591,7 @@ async def ai_chat_api(request: web.Request) -> Response:
                     "Попробуйте позже."
                 )
 
-            return web.json_response({
+            return json_response({
                 "success": False,
                 "error": error_msg,
                 "reply": user_friendly_msg,
@@ -559,7 +613,7 @@ async def ai_chat_api(request: web.Request) -> Response:
                         "pictures": product.get("pictures", [])
                     })
 
-        return web.json_response({
+        return json_response({
             "success": True,
             "reply": reply_text,
             "recommended_products": recommended_list,
@@ -568,7 +622,7 @@ async def ai_chat_api(request: web.Request) -> Response:
         })
     except Exception as e:
         logger.error("Ошибка AI чата: %s", e, exc_info=True)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -577,14 +631,14 @@ async def ai_chat_api(request: web.Request) -> Response:
 async def submit_wholesale_api(request: web.Request) -> Response:
     """Submit wholesale request."""
     try:
-        data = await request.json()
-        user_id = data.get('user_id')
+        data = await request.json(loads=loads)
+        user_id = resolve_user_id(request, data.get('user_id'))
         name = data.get('name')
         contact = data.get('contact')
         question = data.get('question')
 
         if not all([user_id, name, contact, question]):
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "All fields required"},
                 status=400
             )
@@ -592,9 +646,10 @@ async def submit_wholesale_api(request: web.Request) -> Response:
         from database.wholesale import save_wholesale_request
         from config.settings import TELEGRAM_BOT_TOKEN, OWNER_CHAT_ID
 
-        request_id = save_wholesale_request(
-            int(user_id), name, contact, question
-        )
+        with stage("db"):
+            request_id = save_wholesale_request(
+                int(user_id), name, contact, question
+            )
 
         # Отправляем уведомление админу
         try:
@@ -607,27 +662,28 @@ async def submit_wholesale_api(request: web.Request) -> Response:
                     f"Контакт: {contact}\n"
                     f"Вопрос: {question}"
                 )
-                await session.post(
-                    (
-                        f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
-                        "/sendMessage"
-                    ),
-                    json={
-                        "chat_id": OWNER_CHAT_ID,
-                        "text": message,
-                        "parse_mode": "HTML"
-                    }
-                )
+                with stage("upstream"):
+                    await session.post(
+                        (
+                            f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}"
+                            "/sendMessage"
+                        ),
+                        json={
+                            "chat_id": OWNER_CHAT_ID,
+                            "text": message,
+                            "parse_mode": "HTML"
+                        }
+                    )
         except Exception as e:
             logger.error("Ошибка отправки уведомления: %s", e)
 
-        return web.json_response({
+        return json_response({
             "success": True,
             "request_id": request_id
         })
     except Exception as e:
         logger.error("Ошибка оптовой заявки: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -636,62 +692,56 @@ async def submit_wholesale_api(request: web.Request) -> Response:
 async def get_subscription_status(request: web.Request) -> Response:
     """Get user subscription status."""
     try:
-        user_id = request.query.get('user_id')
+        user_id = resolve_user_id(request, request.query.get('user_id'))
         if not user_id:
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "user_id required"},
                 status=400
             )
 
-        from database.subscriptions import is_user_subscribed
-        subscribed = is_user_subscribed(int(user_id))
+        subscribed = is_subscribed(int(user_id))
 
-        return web.json_response({
+        return json_response({
             "success": True,
             "subscribed": subscribed
         })
     except Exception as e:
         logger.error("Ошибка получения статуса подписки: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
 
 
-async def toggle_subscription_api(request: web.Request) -> Response:
-    """Toggle user subscription."""
+async def set_subscription_api(request: web.Request) -> Response:
+    """Subscribe or unsubscribe user ("subscribe": true/false)."""
     try:
-        data = await request.json()
-        user_id = data.get('user_id')
+        data = await request.json(loads=loads)
+        user_id = resolve_user_id(request, data.get('user_id'))
         chat_id = data.get('chat_id')
         username = data.get('username', '')
+        subscribe = data.get('subscribe')
 
-        if not user_id or not chat_id:
-            return web.json_response(
-                {"success": False, "error": "user_id and chat_id required"},
+        if not user_id or not chat_id or not isinstance(subscribe, bool):
+            return json_response(
+                {
+                    "success": False,
+                    "error": "user_id, chat_id and subscribe required"
+                },
                 status=400
             )
 
-        from database.subscriptions import (
-            is_user_subscribed, subscribe_user, unsubscribe_user
+        new_status = set_subscription(
+            int(user_id), int(chat_id), username, subscribe
         )
 
-        subscribed = is_user_subscribed(int(user_id))
-
-        if subscribed:
-            unsubscribe_user(int(user_id))
-            new_status = False
-        else:
-            subscribe_user(int(user_id), int(chat_id), username)
-            new_status = True
-
-        return web.json_response({
+        return json_response({
             "success": True,
             "subscribed": new_status
         })
     except Exception as e:
         logger.error("Ошибка переключения подписки: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
@@ -707,40 +757,166 @@ async def get_user_orders_api(request: web.Request) -> Response:
         request.query.get('user_id')
     )
     try:
-        user_id = request.query.get('user_id')
+        user_id = resolve_user_id(request, request.query.get('user_id'))
         if not user_id:
-            return web.json_response(
+            return json_response(
                 {"success": False, "error": "user_id required"},
                 status=400
             )
 
-        from database.orders import get_user_orders
-        orders = get_user_orders(int(user_id), limit=20)
-
-        orders_list = []
-        for order in orders:
-            order_id, total_amount, status, created_at, order_data_json = order
-            order_data = json.loads(order_data_json) if order_data_json else {}
-            orders_list.append({
-                "id": order_id,
-                "total_amount": total_amount,
-                "status": status,
-                "created_at": created_at,
-                "order_data": order_data
-            })
+        try:
+            limit = int(request.query.get('limit', ORDERS_PAGE_SIZE))
+            page = list_user_orders(
+                int(user_id),
+                limit=limit,
+                cursor=request.query.get('cursor') or None,
+                full=request.query.get('full') == '1'
+            )
+        except ValueError as e:
+            return json_response(
+                {"success": False, "error": str(e)},
+                status=400
+            )
 
-        return web.json_response({
+        return json_response({
             "success": True,
-            "orders": orders_list
+            "orders": page["orders"],
+            "next_cursor": page["next_cursor"]
         })
     except Exception as e:
         logger.error("Ошибка получения заказов: %s", e)
-        return web.json_response(
+        return json_response(
             {"success": False, "error": str(e)},
             status=500
         )
 
 
+async def get_order_details_api(request: web.Request) -> Response:
+    """Get single order with full order data."""
+    try:
+        user_id = resolve_user_id(request, request.query.get('user_id'))
+        if not user_id:
+            return json_response(
+                {"success": False, "error": "user_id required"},
+                status=400
+            )
+
+        order = get_user_order(
+            int(user_id), int(request.match_info['order_id'])
+        )
+        if order is None:
+            return json_response(
+                {"success": False, "error": "Order not found"},
+                status=404
+            )
+
+        return json_response({
+            "success": True,
+            "order": order
+        })
+    except Exception as e:
+        logger.error("Ошибка получения заказа: %s", e)
+        return json_response(
+            {"success": False, "error": str(e)},
+            status=500
+        )
+
+
+async def get_metrics(request: web.Request) -> Response:
+    """Get in-memory cache metrics (needs debug token)."""
+    if not debug_allowed(request):
+        return json_response(
+            {"success": False, "error": "Forbidden"},
+            status=403
+        )
+    return json_response({
+        "success": True,
+        "auth": auth_stats(),
+        "cart_cache": cart_cache_stats(),
+        "faq_matcher": faq_matcher_stats(),
+        "pricing": pricing_stats(),
+        "push": push_stats(),
+        "rate_limit": rate_limit_stats(),
+        "subscriptions": subscriptions_stats()
+    })
+
+
+async def get_readiness(request: web.Request) -> Response:
+    """Report startup warm-up progress, 503 until it completes."""
+    state = warmup_state()
+    return json_response(
+        {"success": True, **state},
+        status=200 if state["ready"] else 503
+    )
+
+
+async def events_api(request: web.Request) -> web.StreamResponse:
+    """Stream catalog deltas and cart updates (server-sent events)."""
+    # Только проверенный токен потока: иначе чужую корзину получит любой,
+    # кто подставит user_id в query
+    return await stream_events(request, request.get("user_id"))
+
+
+async def events_token_api(request: web.Request) -> Response:
+    """Issue short-lived token for opening user's event stream."""
+    user_id = request.get("user_id")
+    if user_id is None:
+        return json_response(
+            {"success": False, "error": "Telegram initData required"},
+            status=401
+        )
+    return json_response({
+        "success": True,
+        "token": issue_stream_token(user_id),
+        "expires_in": STREAM_TOKEN_TTL
+    })
+
+
+async def get_profile_api(request: web.Request) -> Response:
+    """Get event loop lag and last slow requests (needs debug token)."""
+    if not debug_allowed(request):
+        return json_response(
+            {"success": False, "error": "Forbidden"},
+            status=403
+        )
+    try:
+        limit = int(request.query.get('limit', 0)) or None
+        if limit is not None and limit < 0:
+            raise ValueError(limit)
+    except ValueError:
+        return json_response(
+            {"success": False, "error": "Invalid limit"},
+            status=400
+        )
+    report = (
+        profiling_report(limit) if limit is not None else profiling_report()
+    )
+    return json_response({"success": True, **report})
+
+
+async def set_profile_api(request: web.Request) -> Response:
+    """Toggle profiling at runtime (needs debug token)."""
+    if not debug_allowed(request):
+        return json_response(
+            {"success": False, "error": "Forbidden"},
+            status=403
+        )
+    try:
+        data = await request.json(loads=loads)
+        set_profiling(
+            bool(data.get('enabled')),
+            sampling=bool(data.get('sampling')),
+            slow_ms=data.get('slow_ms')
+        )
+        return json_response({"success": True, **profiling_report(0)})
+    except Exception as e:
+        logger.error("Ошибка переключения профилирования: %s", e)
+        return json_response(
+            {"success": False, "error": str(e)},
+            status=400
+        )
+
+
 @web.middleware
 async def error_middleware(request: web.Request, handler):
     """Middleware для обработки ошибок и добавления CORS заголовков."""
@@ -750,7 +926,9 @@ async def error_middleware(request: web.Request, handler):
             headers={
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': (
+                    'Content-Type, ' + INIT_DATA_HEADER
+                ),
                 'Access-Control-Max-Age': '3600'
             }
         )
@@ -781,10 +959,15 @@ async def error_middleware(request: web.Request, handler):
                 "✅ API ответ: %s %s -> %d",
                 request.method, request.path, response.status
             )
+        # Поток событий уже отправлен со своими заголовками
+        if response.prepared:
+            return response
         # Добавляем CORS заголовки
         response.headers['Access-Control-Allow-Origin'] = '*'
         response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
-        response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+        response.headers['Access-Control-Allow-Headers'] = (
+            'Content-Type, ' + INIT_DATA_HEADER
+        )
 
         # Убеждаемся, что API endpoints всегда возвращают JSON
         if request.path.startswith('/api/'):
@@ -870,7 +1053,7 @@ async def error_middleware(request: web.Request, handler):
                     f"API endpoint not found: {request.method} "
                     f"{request.path}. Проверьте, что сервер запущен."
                 )
-            return web.json_response({
+            return json_response({
                 "success": False,
                 "error": error_msg
             }, status=ex.status)
@@ -879,7 +1062,7 @@ async def error_middleware(request: web.Request, handler):
         logger.error("Необработанная ошибка: %s", ex, exc_info=True)
         # Для API запросов возвращаем JSON
         if request.path.startswith('/api/'):
-            return web.json_response({
+            return json_response({
                 "success": False,
                 "error": str(ex)
             }, status=500)
@@ -888,49 +1071,48 @@ async def error_middleware(request: web.Request, handler):
 
 def create_webapp_app() -> web.Application:
     """Create aiohttp application for Mini App."""
-    app = web.Application(middlewares=[error_middleware])
+    # rate_limit_middleware первым: отказ без логирования и работы хендлера
+    app = web.Application(middlewares=[
+        rate_limit_middleware, profiling_middleware, error_middleware,
+        auth_middleware
+    ])
 
     # API routes (должны быть первыми!)
     app.add_routes([
         web.get("/api/products", get_products),
+        web.get("/api/products/{product_id}", get_product_api),
         web.get("/api/categories", get_categories),
         web.get("/api/cart", get_cart),
         web.post("/api/cart/add", add_to_cart_api),
         web.post("/api/cart/remove", remove_from_cart_api),
         web.post("/api/cart/update", update_cart_quantity_api),
+        web.post("/api/cart/quote", quote_cart_api),
         web.post("/api/order", submit_order_api),
         web.get("/api/search", search_products_api),
         web.get("/api/faq", get_faq),
         web.post("/api/ai/chat", ai_chat_api),
         web.post("/api/wholesale", submit_wholesale_api),
         web.get("/api/subscription", get_subscription_status),
-        web.post("/api/subscription/toggle", toggle_subscription_api),
+        web.post("/api/subscription/toggle", set_subscription_api),
         web.get("/api/orders", get_user_orders_api),
+        web.get("/api/orders/{order_id:\\d+}", get_order_details_api),
+        web.get("/api/metrics", get_metrics),
+        web.get("/api/ready", get_readiness),
+        web.get("/api/events", events_api),
+        web.post("/api/events/token", events_token_api),
+        web.get("/api/debug/profile", get_profile_api),
+        web.post("/api/debug/profile", set_profile_api),
     ])
-    
-    # Логируем зарегистрированные маршруты при запуске
-    logger.info("📋 Зарегистрированные API маршруты:")
-    ai_chat_found = False
-    orders_found = False
-    for route in app.router.routes():
-        route_str = str(route.resource)
-        method = getattr(route, 'method', 'ANY')
-        if '/api/' in route_str:
-            logger.info("   %s %s", method, route_str)
-            if '/api/ai/chat' in route_str:
-                ai_chat_found = True
-            if '/api/orders' in route_str:
-                orders_found = True
-    
-    if not ai_chat_found:
-        logger.error("❌ КРИТИЧНО: Маршрут /api/ai/chat НЕ ЗАРЕГИСТРИРОВАН!")
-    else:
-        logger.info("✅ Маршрут /api/ai/chat успешно зарегистрирован")
-    
-    if not orders_found:
-        logger.error("❌ КРИТИЧНО: Маршрут /api/orders НЕ ЗАРЕГИСТРИРОВАН!")
-    else:
-        logger.info("✅ Маршрут /api/orders успешно зарегистрирован")
+
+    # Без токена бота сервер не стартует, а не отвечает 500 на каждый запрос
+    app.on_startup.append(check_auth_settings)
+    # Прогрев кэшей в фоне, готовность: GET /api/ready
+    app.on_startup.append(start_warmup)
+    app.on_cleanup.append(stop_warmup)
+    app.on_startup.append(start_catalog_watcher)
+    app.on_cleanup.append(stop_catalog_watcher)
+    app.on_startup.append(start_profiling)
+    app.on_cleanup.append(stop_profiling)
 
     # Static files
     app.add_routes([
@@ -13,6 +13,15 @@ const API_BASE_URL = window.location.origin;
 console.log('🌐 Базовый URL для API:', API_BASE_URL);
 console.log('📍 Текущий URL:', window.location.href);
 
+// Fetch wrapper: передает подписанный initData для проверки на сервере
+function apiFetch(url, options = {}) {
+    const headers = { ...(options.headers || {}) };
+    if (tg && tg.initData) {
+        headers['X-Telegram-Init-Data'] = tg.initData;
+    }
+    return fetch(url, { ...options, headers });
+}
+
 // Helper function to get user ID from Telegram WebApp
 function getUserId() {
     // Метод 0: Проверка доступности Telegram WebApp API
@@ -77,7 +86,12 @@ let state = {
     currentCategory: null,
     currentProduct: null,
     currentPage: 1,
-    itemsPerPage: 10
+    itemsPerPage: 10,
+    checkoutKey: null,
+    catalogVersion: null,
+    cartQuote: null,
+    cartSignature: null,
+    subscribed: null
 };
 
 // Helper function to safely parse JSON response
@@ -183,8 +197,106 @@ document.addEventListener('DOMContentLoaded', async () => {
     await loadData();
     setupEventListeners();
     updateCartCount();
+    connectEvents();
 });
 
+// Server-sent events: изменения каталога и корзины без перезагрузки
+let eventSource = null;
+// Поток привязан к пользователю (открыт по токену)
+let eventsUserBound = false;
+
+// initData не передается в URL (попадает в логи): поток открывается
+// по короткоживущему токену, полученному с заголовком initData
+async function getStreamToken() {
+    if (!tg || !tg.initData) return null;
+    try {
+        const res = await apiFetch(`${API_BASE_URL}/api/events/token`, { method: 'POST' });
+        const data = await safeJsonParse(res);
+        return data.success ? data.token : null;
+    } catch (error) {
+        console.error('❌ Ошибка получения токена событий:', error);
+        return null;
+    }
+}
+
+async function connectEvents() {
+    if (!window.EventSource || eventSource) return;
+    
+    const params = new URLSearchParams();
+    const token = await getStreamToken();
+    if (token) params.set('token', token);
+    if (eventSource) return;
+    
+    eventSource = new EventSource(`${API_BASE_URL}/api/events?${params.toString()}`);
+    eventsUserBound = Boolean(token);
+    
+    // Браузер переподключается сам, но с тем же токеном: после отказа
+    // (истек токен, лимит соединений) открываем поток с новым
+    eventSource.addEventListener('error', () => {
+        if (eventSource && eventSource.readyState === EventSource.CLOSED) {
+            eventSource = null;
+            setTimeout(connectEvents, 10000);
+        }
+    });
+    
+    eventSource.addEventListener('hello', (e) => {
+        const data = JSON.parse(e.data);
+        // Пропустили изменения, пока соединение было закрыто
+        if (state.catalogVersion !== null && data.version !== null && data.version !== state.catalogVersion) {
+            loadData();
+        }
+    });
+    
+    eventSource.addEventListener('catalog', (e) => {
+        const delta = JSON.parse(e.data);
+        if (state.catalogVersion !== delta.from_version) {
+            loadData();
+            return;
+        }
+        applyCatalogDelta(delta);
+    });
+    
+    eventSource.addEventListener('cart', (e) => {
+        applyCart(JSON.parse(e.data));
+    });
+    
+    eventSource.addEventListener('resync', () => {
+        loadData();
+    });
+}
+
+// Сервер сам присылает корзину после изменения, если поток привязан
+// к проверенному пользователю: повторный GET /api/cart не нужен
+function cartPushActive() {
+    return Boolean(eventSource && eventSource.readyState === EventSource.OPEN && eventsUserBound);
+}
+
+// Apply compact catalog delta to loaded products
+function applyCatalogDelta(delta) {
+    const byId = new Map(state.products.map(p => [String(p.id), p]));
+    delta.changed.forEach(fields => {
+        const product = byId.get(String(fields.id));
+        if (product) {
+            Object.assign(product, fields);
+        } else {
+            state.products.push(fields);
+        }
+    });
+    if (delta.removed.length > 0) {
+        const removed = new Set(delta.removed.map(String));
+        state.products = state.products.filter(p => !removed.has(String(p.id)));
+    }
+    state.catalogVersion = delta.version;
+    console.log(`🔄 Каталог обновлен до версии ${delta.version}: изменено ${delta.changed.length}, удалено ${delta.removed.length}`);
+    
+    if (state.currentCategory !== null) {
+        renderProducts();
+    }
+    if (state.cart.length > 0) {
+        loadCart();
+    }
+}
+
 // Load data
 async function loadData() {
     showLoading(true);
@@ -194,7 +306,7 @@ async function loadData() {
         try {
             const url = `${API_BASE_URL}/api/products`;
             console.log('📦 Запрос товаров - URL:', url);
-            const productsRes = await fetch(url);
+            const productsRes = await apiFetch(url);
             console.log('📦 Ответ товаров - статус:', productsRes.status, 'URL:', productsRes.url, 'content-type:', productsRes.headers.get('content-type'));
             productsData = await safeJsonParse(productsRes);
             if (!productsData.products) {
@@ -213,7 +325,7 @@ async function loadData() {
         try {
             const url = `${API_BASE_URL}/api/categories`;
             console.log('📁 Запрос категорий - URL:', url);
-            const categoriesRes = await fetch(url);
+            const categoriesRes = await apiFetch(url);
             console.log('📁 Ответ категорий - статус:', categoriesRes.status, 'URL:', categoriesRes.url, 'content-type:', categoriesRes.headers.get('content-type'));
             categoriesData = await safeJsonParse(categoriesRes);
             if (!categoriesData.categories) {
@@ -230,6 +342,7 @@ async function loadData() {
         // Обрабатываем результаты
         if (productsData.success && productsData.products && productsData.products.length > 0) {
             state.products = productsData.products;
+            state.catalogVersion = productsData.version ?? null;
             console.log(`✅ Загружено ${state.products.length} товаров`);
             // Показываем категории, если товары загружены
             if (categoriesData.success && categoriesData.categories && categoriesData.categories.length > 0) {
@@ -272,6 +385,24 @@ async function loadData() {
     }
 }
 
+// Apply cart payload from GET /api/cart or SSE, skipping unchanged carts
+function applyCart(data) {
+    const signature = JSON.stringify([
+        data.cart.map(item => [item.product_id, item.quantity, item.subtotal]),
+        data.subtotal, data.delivery_cost, data.total
+    ]);
+    if (signature === state.cartSignature) return;
+    state.cartSignature = signature;
+    state.cart = data.cart;
+    state.cartQuote = {
+        subtotal: data.subtotal,
+        delivery_cost: data.delivery_cost,
+        total: data.total
+    };
+    renderCart();
+    updateCartCount();
+}
+
 // Load cart
 async function loadCart() {
     const userId = getUserId();
@@ -282,12 +413,10 @@ async function loadCart() {
     }
     
     try {
-        const res = await fetch(`${API_BASE_URL}/api/cart?user_id=${userId}`);
+        const res = await apiFetch(`${API_BASE_URL}/api/cart?user_id=${userId}`);
         const data = await safeJsonParse(res);
         if (data.success) {
-            state.cart = data.cart;
-            renderCart();
-            updateCartCount();
+            applyCart(data);
         } else {
             console.warn('Ошибка загрузки корзины:', data.error);
         }
@@ -528,7 +657,7 @@ async function addToCart(productId) {
     }
     
     try {
-        const res = await fetch(`${API_BASE_URL}/api/cart/add`, {
+        const res = await apiFetch(`${API_BASE_URL}/api/cart/add`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
@@ -545,7 +674,7 @@ async function addToCart(productId) {
                 message: 'Товар добавлен в корзину!',
                 buttons: [{type: 'ok'}]
             });
-            await loadCart();
+            if (!cartPushActive()) await loadCart();
         } else {
             tg.showAlert('Ошибка: ' + (data.error || 'Неизвестная ошибка'));
         }
@@ -560,7 +689,7 @@ async function removeFromCart(productId) {
     if (!userId) return;
     
     try {
-        const res = await fetch(`${API_BASE_URL}/api/cart/remove`, {
+        const res = await apiFetch(`${API_BASE_URL}/api/cart/remove`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
@@ -571,7 +700,7 @@ async function removeFromCart(productId) {
         
         const data = await safeJsonParse(res);
         if (data.success) {
-            await loadCart();
+            if (!cartPushActive()) await loadCart();
         }
     } catch (error) {
         console.error('Ошибка удаления из корзины:', error);
@@ -589,7 +718,7 @@ async function updateQuantity(productId, quantity) {
     if (!userId) return;
     
     try {
-        const res = await fetch(`${API_BASE_URL}/api/cart/update`, {
+        const res = await apiFetch(`${API_BASE_URL}/api/cart/update`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
@@ -601,7 +730,7 @@ async function updateQuantity(productId, quantity) {
         
         const data = await safeJsonParse(res);
         if (data.success) {
-            await loadCart();
+            if (!cartPushActive()) await loadCart();
         }
     } catch (error) {
         console.error('Ошибка обновления количества:', error);
@@ -653,7 +782,7 @@ function renderCart() {
                     <span class="quantity-value">${item.quantity}</span>
                     <button class="quantity-btn" onclick="updateQuantity('${product.id}', ${item.quantity + 1})">+</button>
                 </div>
-                <div class="cart-item-total">${subtotal.toFixed(2)} ₽</div>
+                <div class="cart-item-total">${item.subtotal === null ? 'Цена уточняется' : subtotal.toFixed(2) + ' ₽'}</div>
                 <button class="remove-btn" onclick="removeFromCart('${product.id}')">Удалить</button>
             </div>
         `;
@@ -661,7 +790,13 @@ function renderCart() {
     });
     
     document.getElementById('cart-items-count').textContent = itemsCount;
-    document.getElementById('cart-total').textContent = total.toFixed(2) + ' ₽';
+    // Сумма, доставка и итог посчитаны сервером вместе с корзиной
+    const quote = state.cartQuote || {subtotal: total, delivery_cost: null, total: total};
+    document.getElementById('cart-subtotal').textContent = quote.subtotal.toFixed(2) + ' ₽';
+    document.getElementById('cart-delivery').textContent = quote.delivery_cost === null
+        ? '—'
+        : quote.delivery_cost > 0 ? quote.delivery_cost.toFixed(2) + ' ₽' : 'Бесплатно';
+    document.getElementById('cart-total').textContent = quote.total.toFixed(2) + ' ₽';
 }
 
 // Update cart count
@@ -694,8 +829,20 @@ function changePage(page) {
     window.scrollTo(0, 0);
 }
 
+// Generate idempotency key for order submission
+function generateIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+}
+
 // Open checkout modal
 function openCheckoutModal() {
+    // Один ключ на попытку оформления: повторное нажатие не создаст второй заказ
+    if (!state.checkoutKey) {
+        state.checkoutKey = generateIdempotencyKey();
+    }
     document.getElementById('checkout-modal').classList.remove('hidden');
 }
 
@@ -729,17 +876,19 @@ async function handleCheckout(e) {
     };
     
     try {
-        const res = await fetch(`${API_BASE_URL}/api/order`, {
+        const res = await apiFetch(`${API_BASE_URL}/api/order`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
                 user_id: userId,
-                order_data: orderData
+                order_data: orderData,
+                idempotency_key: state.checkoutKey
             })
         });
         
         const data = await safeJsonParse(res);
         if (data.success) {
+            state.checkoutKey = null;
             tg.showPopup({
                 title: 'Заказ оформлен!',
                 message: 'Спасибо за заказ! Мы свяжемся с вами в ближайшее время.',
@@ -799,7 +948,7 @@ async function searchProducts() {
     
     showLoading(true);
     try {
-        const res = await fetch(`${API_BASE_URL}/api/search?q=${encodeURIComponent(query)}`);
+        const res = await apiFetch(`${API_BASE_URL}/api/search?q=${encodeURIComponent(query)}`);
         const data = await safeJsonParse(res);
         
         if (data.success) {
@@ -897,7 +1046,7 @@ async function sendAIMessage() {
         console.log('🤖 Отправка запроса к ИИ:', url);
         console.log('📤 Данные запроса:', { user_id: userId, message: message.substring(0, 50) + '...' });
         
-        const res = await fetch(url, {
+        const res = await apiFetch(url, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
@@ -997,27 +1146,20 @@ async function showProductDetailsById(productId) {
     // Ищем товар в загруженных
     let product = state.products.find(p => String(p.id) === String(productId));
     
-    // Если не найден, загружаем из API
+    // Если не найден, загружаем только этот товар
     if (!product) {
         try {
-            const res = await fetch(`${API_BASE_URL}/api/products`);
+            const res = await apiFetch(`${API_BASE_URL}/api/products/${encodeURIComponent(productId)}`);
             const data = await safeJsonParse(res);
-            if (data.success && data.products) {
-                state.products = data.products;
-                product = state.products.find(p => String(p.id) === String(productId));
-                if (product) {
-                    showTab('catalog');
-                    setTimeout(() => showProductDetails(product), 100);
-                } else {
-                    const errorMsg = 'Товар не найден';
-                    if (tg && tg.showAlert) {
-                        tg.showAlert(errorMsg);
-                    } else {
-                        alert(errorMsg);
-                    }
-                }
+            if (data.success && data.product) {
+                product = data.product;
+                state.products.push(product);
+                showTab('catalog');
+                setTimeout(() => showProductDetails(product), 100);
             } else {
-                const errorMsg = 'Ошибка загрузки товаров: ' + (data.error || 'Неизвестная ошибка');
+                const errorMsg = res.status === 404
+                    ? 'Товар не найден'
+                    : 'Ошибка загрузки товара: ' + (data.error || 'Неизвестная ошибка');
                 if (tg && tg.showAlert) {
                     tg.showAlert(errorMsg);
                 } else {
@@ -1067,7 +1209,7 @@ function hideInfoSection() {
 
 async function loadFAQ() {
     try {
-        const res = await fetch(`${API_BASE_URL}/api/faq`);
+        const res = await apiFetch(`${API_BASE_URL}/api/faq`);
         const data = await safeJsonParse(res);
         
         if (data.success) {
@@ -1182,7 +1324,62 @@ function loadReferral() {
     `;
 }
 
-async function loadOrders() {
+function formatOrderDate(createdAt) {
+    return createdAt ? new Date(createdAt).toLocaleDateString('ru-RU', {
+        year: 'numeric',
+        month: 'long',
+        day: 'numeric',
+        hour: '2-digit',
+        minute: '2-digit'
+    }) : 'Дата не указана';
+}
+
+function renderOrderSummary(order) {
+    return `
+        <div class="order-item">
+            <div class="order-header">
+                <span><b>Заказ #${order.id}</b></span>
+                <span class="order-status">${order.status || 'pending'}</span>
+            </div>
+            <div class="order-info">
+                <p><b>Сумма:</b> ${(order.total_amount || 0).toFixed(2)} ₽</p>
+                <p><b>Дата:</b> ${formatOrderDate(order.created_at)}</p>
+                <div id="order-details-${order.id}">
+                    <button class="btn-secondary" onclick="loadOrderDetails(${order.id})">Подробнее</button>
+                </div>
+            </div>
+        </div>
+    `;
+}
+
+// Load order details on demand
+async function loadOrderDetails(orderId) {
+    const userId = getUserId();
+    const container = document.getElementById(`order-details-${orderId}`);
+    if (!userId || !container) return;
+    
+    try {
+        const res = await apiFetch(`${API_BASE_URL}/api/orders/${orderId}?user_id=${userId}`);
+        const data = await safeJsonParse(res);
+        if (data.success) {
+            const orderData = data.order.order_data || {};
+            container.innerHTML = `
+                ${orderData.name ? `<p><b>Получатель:</b> ${escapeHtml(orderData.name)}</p>` : ''}
+                ${orderData.phone ? `<p><b>Телефон:</b> ${escapeHtml(orderData.phone)}</p>` : ''}
+                ${orderData.address ? `<p><b>Адрес:</b> ${escapeHtml(orderData.address)}</p>` : ''}
+                ${orderData.shipping ? `<p><b>Доставка:</b> ${escapeHtml(orderData.shipping)}</p>` : ''}
+            `;
+        } else {
+            container.innerHTML = '<p class="text-muted">Ошибка загрузки заказа: ' + escapeHtml(data.error || 'Неизвестная ошибка') + '</p>';
+        }
+    } catch (error) {
+        console.error('Ошибка загрузки заказа:', error);
+        container.innerHTML = '<p class="text-muted">Ошибка соединения: ' + escapeHtml(error.message) + '</p>';
+    }
+}
+
+// Load orders page (cursor = null loads the first page)
+async function loadOrders(cursor = null) {
     const userId = getUserId();
     // getUserId() всегда возвращает значение (реальный или тестовый)
     if (!userId) {
@@ -1196,43 +1393,39 @@ async function loadOrders() {
     
     showLoading(true);
     try {
-        const res = await fetch(`${API_BASE_URL}/api/orders?user_id=${userId}`);
+        let url = `${API_BASE_URL}/api/orders?user_id=${userId}`;
+        if (cursor) {
+            url += `&cursor=${encodeURIComponent(cursor)}`;
+        }
+        const res = await apiFetch(url);
         const data = await safeJsonParse(res);
         
         if (data.success) {
             const container = document.getElementById('orders-list');
             if (!container) return;
             
-            if (data.orders.length === 0) {
+            const moreBtn = document.getElementById('orders-more-btn');
+            if (moreBtn) {
+                moreBtn.remove();
+            }
+            
+            if (!cursor && data.orders.length === 0) {
                 container.innerHTML = '<div class="empty-state"><p>📦 У вас пока нет заказов</p><p class="text-muted">Ваши заказы будут отображаться здесь</p></div>';
             } else {
-                container.innerHTML = data.orders.map(order => {
-                    const orderData = order.order_data || {};
-                    const createdDate = order.created_at ? new Date(order.created_at).toLocaleDateString('ru-RU', {
-                        year: 'numeric',
-                        month: 'long',
-                        day: 'numeric',
-                        hour: '2-digit',
-                        minute: '2-digit'
-                    }) : 'Дата не указана';
-                    
-                    return `
-                        <div class="order-item">
-                            <div class="order-header">
-                                <span><b>Заказ #${order.id}</b></span>
-                                <span class="order-status">${order.status || 'pending'}</span>
-                            </div>
-                            <div class="order-info">
-                                <p><b>Сумма:</b> ${(order.total_amount || 0).toFixed(2)} ₽</p>
-                                <p><b>Дата:</b> ${createdDate}</p>
-                                ${orderData.name ? `<p><b>Получатель:</b> ${escapeHtml(orderData.name)}</p>` : ''}
-                                ${orderData.phone ? `<p><b>Телефон:</b> ${escapeHtml(orderData.phone)}</p>` : ''}
-                                ${orderData.address ? `<p><b>Адрес:</b> ${escapeHtml(orderData.address)}</p>` : ''}
-                                ${orderData.shipping ? `<p><b>Доставка:</b> ${escapeHtml(orderData.shipping)}</p>` : ''}
-                            </div>
-                        </div>
-                    `;
-                }).join('');
+                const html = data.orders.map(renderOrderSummary).join('');
+                if (cursor) {
+                    container.insertAdjacentHTML('beforeend', html);
+                } else {
+                    container.innerHTML = html;
+                }
+                if (data.next_cursor) {
+                    const btn = document.createElement('button');
+                    btn.id = 'orders-more-btn';
+                    btn.className = 'btn-secondary';
+                    btn.textContent = 'Показать ещё';
+                    btn.onclick = () => loadOrders(data.next_cursor);
+                    container.appendChild(btn);
+                }
             }
         } else {
             const container = document.getElementById('orders-list');
@@ -1260,12 +1453,13 @@ async function loadSubscription() {
     }
     
     try {
-        const res = await fetch(`${API_BASE_URL}/api/subscription?user_id=${userId}`);
+        const res = await apiFetch(`${API_BASE_URL}/api/subscription?user_id=${userId}`);
         const data = await safeJsonParse(res);
         
         if (data.success) {
             const statusEl = document.getElementById('subscription-status');
             const btnEl = document.getElementById('toggle-subscription-btn');
+            state.subscribed = data.subscribed;
             
             if (data.subscribed) {
                 statusEl.innerHTML = '<p>✅ Вы подписаны на обновления</p>';
@@ -1310,13 +1504,15 @@ async function toggleSubscription() {
     }
     
     try {
-        const res = await fetch(`${API_BASE_URL}/api/subscription/toggle`, {
+        const res = await apiFetch(`${API_BASE_URL}/api/subscription/toggle`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
                 user_id: userId,
                 chat_id: finalChatId,
-                username: username
+                username: username,
+                // Запрашиваем состояние, противоположное показанному
+                subscribe: !state.subscribed
             })
         });
         
@@ -1353,7 +1549,7 @@ async function submitWholesale(e) {
     
     const formData = new FormData(e.target);
     try {
-        const res = await fetch(`${API_BASE_URL}/api/wholesale`, {
+        const res = await apiFetch(`${API_BASE_URL}/api/wholesale`, {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({
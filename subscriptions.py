@@ -0,0 +1,174 @@
+"""In-memory subscription status index for Mini App.
+
+Changes go through database.subscriptions helpers. Bulk reads (index
+load, subscriber export) have no helper there and read the
+subscriptions table directly, counting a user as subscribed when a row
+for them exists.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+from config.settings import logger
+from database.connection import get_db_connection
+from webapp.profiling import stage
+
+# Подписки меняет и бот, поэтому индекс периодически перечитывается
+SUBSCRIPTIONS_RELOAD_INTERVAL = 300.0
+SUBSCRIBERS_BATCH_SIZE = 500
+
+_subscribed: Optional[Set[int]] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+# Изменения, сделанные во время перечитывания индекса: иначе их
+# затрет снимок, прочитанный до изменения
+_changes_during_reload: Optional[Dict[int, bool]] = None
+_reload_task: Optional["asyncio.Future[Any]"] = None
+
+
+def load_subscriptions() -> int:
+    """Load subscribed user ids into memory, return their count."""
+    global _subscribed, _loaded_at, _changes_during_reload
+    started = time.perf_counter()
+    with _lock:
+        _changes_during_reload = {}
+    try:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT user_id FROM subscriptions"
+            ).fetchall()
+        subscribed = {row[0] for row in rows}
+        with _lock:
+            for user_id, status in _changes_during_reload.items():
+                if status:
+                    subscribed.add(user_id)
+                else:
+                    subscribed.discard(user_id)
+            _subscribed = subscribed
+            _loaded_at = time.monotonic()
+    finally:
+        with _lock:
+            _changes_during_reload = None
+    logger.info(
+        "Индекс подписок загружен: %d подписчиков за %.1f мс",
+        len(subscribed), (time.perf_counter() - started) * 1000
+    )
+    return len(subscribed)
+
+
+def _schedule_reload() -> None:
+    """Reload index in executor unless a reload is already running."""
+    global _reload_task
+    if _reload_task is not None and not _reload_task.done():
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Вызов не из event loop (например, из потока бота)
+        load_subscriptions()
+        return
+    _reload_task = loop.run_in_executor(None, load_subscriptions)
+    _reload_task.add_done_callback(_log_reload_error)
+
+
+def _log_reload_error(task: "asyncio.Future[Any]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            "Ошибка перечитывания индекса подписок: %s", task.exception()
+        )
+
+
+def is_subscribed(user_id: int) -> bool:
+    """Check subscription status, normally without touching the DB.
+
+    A stale index is still answered from and reloaded in background;
+    before the first load is_user_subscribed is asked for this user.
+    """
+    subscribed = _subscribed
+    if (
+        subscribed is None or
+        time.monotonic() - _loaded_at > SUBSCRIPTIONS_RELOAD_INTERVAL
+    ):
+        _schedule_reload()
+    if subscribed is not None:
+        return user_id in subscribed
+    from database.subscriptions import is_user_subscribed
+    with stage("db"):
+        return bool(is_user_subscribed(user_id))
+
+
+def set_subscribed(user_id: int, subscribed: bool) -> None:
+    """Update index after subscription was changed elsewhere (e.g. bot)."""
+    with _lock:
+        if _changes_during_reload is not None:
+            _changes_during_reload[user_id] = subscribed
+        if _subscribed is None:
+            return
+        if subscribed:
+            _subscribed.add(user_id)
+        else:
+            _subscribed.discard(user_id)
+
+
+def set_subscription(
+    user_id: int, chat_id: int, username: str, subscribe: bool
+) -> bool:
+    """Bring subscription to the requested state, return it.
+
+    Writes go through database.subscriptions like the bot's, so both
+    agree on the schema. Applying the requested state (instead of
+    flipping the stored one) keeps a stale status on screen or a
+    repeated request from inverting the user's choice.
+    """
+    from database.subscriptions import (
+        is_user_subscribed, subscribe_user, unsubscribe_user
+    )
+    with stage("db"):
+        if bool(is_user_subscribed(user_id)) != subscribe:
+            if subscribe:
+                subscribe_user(user_id, chat_id, username)
+            else:
+                unsubscribe_user(user_id)
+    set_subscribed(user_id, subscribe)
+    return subscribe
+
+
+def iter_subscribers(
+    batch_size: int = SUBSCRIBERS_BATCH_SIZE
+) -> Iterator[Tuple[int, int, str]]:
+    """Iterate over subscribers as (user_id, chat_id, username).
+
+    Rows are fetched in keyset batches by user_id, each with a short
+    query, so broadcast jobs can send messages between batches without
+    holding a connection or building the whole list in memory.
+    """
+    last_user_id = None
+    while True:
+        with get_db_connection() as conn:
+            if last_user_id is None:
+                rows = conn.execute(
+                    "SELECT user_id, chat_id, username FROM subscriptions "
+                    "ORDER BY user_id LIMIT ?",
+                    (batch_size,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT user_id, chat_id, username FROM subscriptions "
+                    "WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                    (last_user_id, batch_size)
+                ).fetchall()
+        for row in rows:
+            yield row[0], row[1], row[2] or ""
+        if len(rows) < batch_size:
+            return
+        last_user_id = rows[-1][0]
+
+
+def subscriptions_stats() -> Dict[str, Any]:
+    """Get subscription index size."""
+    subscribed = _subscribed
+    return {
+        "loaded": subscribed is not None,
+        "subscribers": len(subscribed) if subscribed is not None else 0
+    }
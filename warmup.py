@@ -0,0 +1,131 @@
+"""Startup warm-up for Mini App: imports, caches and readiness state."""
+import asyncio
+import importlib
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from config.settings import logger
+from webapp.assets import get_faq_body, preload_assets
+from webapp.catalog import get_catalog
+from webapp.faq_matcher import get_faq_matcher
+from webapp.orders import ensure_order_indexes
+from webapp.subscriptions import load_subscriptions
+
+# Модули, которые хендлеры импортируют при первом вызове
+HANDLER_MODULES = (
+    "database.cart",
+    "database.orders",
+    "database.subscriptions",
+    "database.wholesale",
+    "services.ai_service",
+    "personality.faq",
+    "utils.delivery",
+)
+
+# Без этих этапов хендлеры не работают: сервер остается неготовым (503)
+CRITICAL_STAGES = frozenset({"imports", "catalog"})
+
+_task: Optional["asyncio.Future[None]"] = None
+_state: Dict[str, Any] = {
+    "ready": False,
+    "started": False,
+    "total_ms": None,
+    "stages": {},
+    "errors": {},
+}
+
+
+def _import_handler_modules() -> int:
+    for name in HANDLER_MODULES:
+        importlib.import_module(name)
+    return len(HANDLER_MODULES)
+
+
+def _warm_catalog() -> int:
+    catalog = get_catalog(force=True)
+    return len(catalog.products) if catalog is not None else 0
+
+
+def _warm_search_index() -> int:
+    catalog = get_catalog()
+    return len(catalog.search_index) if catalog is not None else 0
+
+
+def _warm_faq() -> int:
+    return len(get_faq_body())
+
+
+def _warm_faq_matcher() -> int:
+    return len(get_faq_matcher().entries)
+
+
+WARMUP_STAGES: List[Tuple[str, Callable[[], Any]]] = [
+    ("imports", _import_handler_modules),
+    ("catalog", _warm_catalog),
+    ("search_index", _warm_search_index),
+    ("faq", _warm_faq),
+    ("faq_matcher", _warm_faq_matcher),
+    ("static_assets", preload_assets),
+    ("subscriptions", load_subscriptions),
+    ("order_indexes", ensure_order_indexes),
+]
+
+
+async def run_warmup() -> None:
+    """Run warm-up stages in a worker thread, recording their durations.
+
+    A failed stage is logged and recorded; the rest still run and the
+    corresponding caches are filled lazily on first request. The server
+    is reported ready only if no stage of CRITICAL_STAGES failed.
+    """
+    loop = asyncio.get_running_loop()
+    _state["started"] = True
+    started = time.perf_counter()
+    for name, stage in WARMUP_STAGES:
+        stage_started = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(None, stage)
+            _state["stages"][name] = {
+                "ms": round((time.perf_counter() - stage_started) * 1000, 2),
+                "result": result
+            }
+        except Exception as e:
+            logger.error("Ошибка прогрева Mini App (%s): %s", name, e)
+            _state["errors"][name] = str(e)
+    _state["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    failed = CRITICAL_STAGES.intersection(_state["errors"])
+    _state["ready"] = not failed
+    if failed:
+        logger.error(
+            "Mini App не готов, ошибки в этапах: %s",
+            ", ".join(sorted(failed))
+        )
+    logger.info(
+        "Прогрев Mini App завершен за %.1f мс: %s",
+        _state["total_ms"],
+        {name: stage["ms"] for name, stage in _state["stages"].items()}
+    )
+
+
+async def start_warmup(app: web.Application) -> None:
+    """on_startup hook: warm caches in background while server starts."""
+    global _task
+    _task = asyncio.ensure_future(run_warmup())
+
+
+async def stop_warmup(app: web.Application) -> None:
+    """on_cleanup hook: cancel unfinished warm-up."""
+    if _task is not None and not _task.done():
+        _task.cancel()
+
+
+def warmup_state() -> Dict[str, Any]:
+    """Get warm-up progress and per-stage timings."""
+    return {
+        "ready": _state["ready"],
+        "started": _state["started"],
+        "total_ms": _state["total_ms"],
+        "stages": dict(_state["stages"]),
+        "errors": dict(_state["errors"]),
+    }